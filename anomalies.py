@@ -0,0 +1,161 @@
+
+"""
+Streaming anomaly detection for expenses.
+
+expense_stats keeps a running count, mean and M2 (Welford) of amounts per
+(user, category), overall and per weekday. Each new expense is scored
+against the stats as they stood before it, in O(1), without rescanning
+history; expenses ANOMALY_Z_THRESHOLD or more deviations above the usual
+amount are recorded in expense_anomalies.
+
+Stats are rebuilt from expenses with `python rollups.py rebuild`.
+"""
+import math
+import os
+from collections import defaultdict
+from sqlalchemy import Integer, cast, exists, extract, func, insert, literal, select, update
+from database import dialect_name, upsert_insert
+from models import Expense, ExpenseAnomaly, ExpenseStat
+from rollups import delete_for_users, to_day
+
+ALL_DAYS = -1
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+# Fewer samples than this and a category (or weekday) isn't scored
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "5"))
+# Deviation floor as a fraction of the mean, so near-constant spending doesn't flag small changes
+ANOMALY_MIN_STD_FRACTION = float(os.getenv("ANOMALY_MIN_STD_FRACTION", "0.1"))
+
+class RunningStats:
+    """Welford's online mean/variance."""
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def std(self) -> float:
+        return math.sqrt(max(self.m2, 0.0) / (self.count - 1)) if self.count > 1 else 0.0
+
+def score(stats, amount: float):
+    """
+    z-score of `amount` against the first of `stats` (weekday, then overall)
+    with enough samples. Returns (score, expected mean) or (None, None).
+    """
+    for running in stats:
+        if running.count >= ANOMALY_MIN_SAMPLES:
+            std = max(running.std(), ANOMALY_MIN_STD_FRACTION * abs(running.mean), 0.01)
+            return (amount - running.mean) / std, running.mean
+    return None, None
+
+def record_expenses(db, user_id: int, entries):
+    """
+    Scores (expense_id, date, category, amount) entries in write order, records
+    the flagged ones and merges the batch into expense_stats. One read and one
+    upsert per batch, inside the caller's transaction. Returns the scores.
+    """
+    entries = [(expense_id, to_day(day), category or "", amount) for expense_id, day, category, amount in entries]
+    if not entries:
+        return []
+    rows = db.execute(
+        select(ExpenseStat.category, ExpenseStat.weekday, ExpenseStat.count, ExpenseStat.mean, ExpenseStat.m2)
+        .where(ExpenseStat.user_id == user_id, ExpenseStat.category.in_({entry[2] for entry in entries}))
+    )
+    current = {(category, weekday): RunningStats(*values) for category, weekday, *values in rows}
+    added = defaultdict(RunningStats)
+
+    scores, flagged = [], []
+    for expense_id, day, category, amount in entries:
+        keys = ((category, day.weekday()), (category, ALL_DAYS))
+        stats = [current.setdefault(key, RunningStats()) for key in keys]
+        value, expected = score(stats, amount)
+        scores.append(value)
+        if value is not None and value >= ANOMALY_Z_THRESHOLD:
+            flagged.append({
+                "expense_id": expense_id, "user_id": user_id, "date": day, "category": category,
+                "amount": amount, "expected": round(expected, 2), "score": round(value, 2),
+            })
+        # Later entries in the batch are scored against the earlier ones too
+        for key, running in zip(keys, stats):
+            running.add(amount)
+            added[key].add(amount)
+
+    _merge(db, user_id, added)
+    if flagged:
+        db.execute(insert(ExpenseAnomaly), flagged)
+    return scores
+
+def _merge(db, user_id: int, added: dict):
+    """
+    Folds each key's batch stats into the stored ones with Chan's parallel
+    update, entirely in SQL from the row's current values, so concurrent
+    writers can't lose each other's samples.
+    """
+    rows = [
+        {"user_id": user_id, "category": category, "weekday": weekday, "count": s.count, "mean": s.mean, "m2": s.m2}
+        for (category, weekday), s in added.items()
+    ]
+
+    def combined(count, mean, m2):
+        total = ExpenseStat.count + count
+        delta = mean - ExpenseStat.mean
+        return {
+            "count": total,
+            "mean": ExpenseStat.mean + delta * count / total,
+            "m2": ExpenseStat.m2 + m2 + delta * delta * ExpenseStat.count * count / total,
+        }
+
+    dialect_insert = upsert_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(ExpenseStat)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "category", "weekday"],
+            set_=combined(stmt.excluded.count, stmt.excluded.mean, stmt.excluded.m2),
+        ), rows)
+        return
+    for row in rows:
+        result = db.execute(
+            update(ExpenseStat)
+            .where(ExpenseStat.user_id == user_id, ExpenseStat.category == row["category"], ExpenseStat.weekday == row["weekday"])
+            .values(**combined(row["count"], row["mean"], row["m2"]))
+        )
+        if result.rowcount == 0:
+            db.execute(insert(ExpenseStat), [row])
+
+def _weekday_expr(db, column):
+    # 0 = Monday, matching date.weekday()
+    if dialect_name(db) == "sqlite":
+        return (cast(func.strftime("%w", column), Integer) + 6) % 7
+    return cast(extract("isodow", column), Integer) - 1
+
+def rebuild(db, user_ids=None) -> int:
+    """
+    Recomputes expense_stats from the expenses table (flagged history is kept).
+    M2 comes from sum of squares here, which is fine at backfill time. Caller commits.
+    """
+    user_ids = delete_for_users(db, ExpenseStat, user_ids)
+    category = func.coalesce(Expense.category, "")
+    count, mean = func.count(Expense.id), func.avg(Expense.amount)
+    m2 = func.sum(Expense.amount * Expense.amount) - count * mean * mean
+    inserted = 0
+    for weekday in (literal(ALL_DAYS), _weekday_expr(db, Expense.date)):
+        query = select(Expense.user_id, category, weekday, count, mean, m2).group_by(Expense.user_id, category, weekday)
+        if user_ids is not None:
+            query = query.where(Expense.user_id.in_(user_ids))
+        inserted += db.execute(
+            insert(ExpenseStat).from_select(["user_id", "category", "weekday", "count", "mean", "m2"], query)
+        ).rowcount
+    return inserted
+
+def backfill_if_needed(db) -> bool:
+    """Builds stats for existing expenses the first time the table is empty; returns True if it did."""
+    if db.scalar(select(exists().select_from(ExpenseStat))) or not db.scalar(select(exists().select_from(Expense))):
+        return False
+    rebuild(db)
+    return True
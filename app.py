@@ -25,16 +25,15 @@ def start_backend():
     cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", "8000"]
     process = subprocess.Popen(cmd)
     
-    # Wait for server to start
-    retries = 10
-    while retries > 0:
+    # Wait for server to start; poll often, startup takes well under a second
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
         try:
-            requests.get("http://127.0.0.1:8000/")
+            requests.get("http://127.0.0.1:8000/", timeout=1)
             print("Backend is running!")
             return process
         except:
-            time.sleep(2)
-            retries -= 1
+            time.sleep(0.1)
     
     print("Backend failed to start.")
     return process
@@ -65,9 +64,46 @@ st.markdown("""
 
 # --- Helper Functions ---
 
+# Cached GETs live this long; writes from this session invalidate them sooner
+GET_CACHE_TTL_SECONDS = 30
+
+@st.cache_resource
+def get_http():
+    # One pooled session per Streamlit process: connections are reused across reruns
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+http = get_http()
+
+def auth_headers(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def _get_json(path, token, params=None):
+    # Raises on failure so errors are never cached
+    res = http.get(f"{API_URL}{path}", headers=auth_headers(token), params=params)
+    res.raise_for_status()
+    return res.json()
+
+@st.cache_data(ttl=GET_CACHE_TTL_SECONDS, show_spinner=False)
+def cached_get(path, token, params=None, epoch=0):
+    # epoch is bumped after this session writes, which moves it to fresh cache keys
+    return _get_json(path, token, dict(params) if params else None)
+
+def api_get(path, token, params=None, default=None):
+    try:
+        return cached_get(path, token, tuple(sorted(params.items())) if params else None, st.session_state.get("data_epoch", 0))
+    except Exception:
+        return default
+
+def invalidate_cache():
+    st.session_state["data_epoch"] = st.session_state.get("data_epoch", 0) + 1
+
 def login(email, password):
     try:
-        res = requests.post(f"{API_URL}/auth/login", json={"email": email, "password": password})
+        res = http.post(f"{API_URL}/auth/login", json={"email": email, "password": password})
         if res.status_code == 200:
             return True, res.json()
         return False, f"Error {res.status_code}: {res.text}"
@@ -76,7 +112,7 @@ def login(email, password):
 
 def register(name, email, password):
     try:
-        res = requests.post(f"{API_URL}/auth/register", json={"name": name, "email": email, "password": password})
+        res = http.post(f"{API_URL}/auth/register", json={"name": name, "email": email, "password": password})
         if res.status_code == 200:
             return True, "Success"
         try:
@@ -88,25 +124,30 @@ def register(name, email, password):
         return False, str(e)
 
 def get_summary(token):
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        res = requests.get(f"{API_URL}/report/summary", headers=headers)
-        return res.json() if res.status_code == 200 else {}
-    except:
-        return {}
+    return api_get("/report/summary", token, default={})
 
 def get_forecast(token):
-    headers = {"Authorization": f"Bearer {token}"}
+    return api_get("/report/forecast", token, default={})
+
+def get_wallets(token):
+    return api_get("/wallet/", token, default=[])
+
+def get_budgets(token, month):
+    # Spend is kept current by the server as expenses are written
+    return api_get("/budget/", token, params={"month": month}, default=[])
+
+def save_budget(token, month, category, limit, existing=None):
     try:
-        res = requests.get(f"{API_URL}/report/forecast", headers=headers)
-        if res.status_code == 200:
-            return res.json().get("forecast", [])
-        return []
+        if existing:
+            res = http.put(f"{API_URL}/budget/{existing['id']}", json={"limit": limit}, headers=auth_headers(token))
+        else:
+            res = http.post(f"{API_URL}/budget/", json={"month": month, "category": category, "limit": limit}, headers=auth_headers(token))
+        invalidate_cache()
+        return res.status_code == 200
     except:
-        return []
+        return False
 
 def add_transaction(token, type_, amount, desc, date, wallet_id):
-    headers = {"Authorization": f"Bearer {token}"}
     endpoint = "/income/" if type_ == "Income" else "/expense/"
     payload = {
         "amount": amount,
@@ -115,23 +156,26 @@ def add_transaction(token, type_, amount, desc, date, wallet_id):
         "wallet_id": wallet_id
     }
     try:
-        requests.post(f"{API_URL}{endpoint}", json=payload, headers=headers)
+        res = http.post(f"{API_URL}{endpoint}", json=payload, headers=auth_headers(token))
+        invalidate_cache()
+        # Shown on the next run: budget thresholds this expense crossed
+        if res.status_code == 200:
+            st.session_state["budget_alerts"] = res.json().get("budget_alerts", [])
         return True
     except:
         return False
 
 def parse_text(token, text):
-    headers = {"Authorization": f"Bearer {token}"}
     try:
-        res = requests.post(f"{API_URL}/nlp/parse", json={"text": text}, headers=headers)
+        res = http.post(f"{API_URL}/nlp/parse", json={"text": text}, headers=auth_headers(token))
         return res.json() if res.status_code == 200 else None
     except:
         return None
 
 def create_wallet(token, name, balance):
-    headers = {"Authorization": f"Bearer {token}"}
     try:
-        requests.post(f"{API_URL}/wallet/", json={"name": name, "balance": balance}, headers=headers)
+        http.post(f"{API_URL}/wallet/", json={"name": name, "balance": balance}, headers=auth_headers(token))
+        invalidate_cache()
         return True
     except:
         return False
@@ -181,17 +225,22 @@ else:
 
     if page == "Dashboard":
         st.header("Financial Overview")
+
+        # Wallets, summary, categories and trend in a single round trip
+        trend_from = (datetime.date.today().replace(day=1) - datetime.timedelta(days=365)).replace(day=1)
+        dashboard = api_get(
+            "/report/dashboard", st.session_state["token"],
+            params={"include": "summary,trend,wallets", "granularity": "month", "trend_from": trend_from.isoformat()},
+            default={},
+        )
+        wallets = dashboard.get("wallets", [])
+        summary = dashboard.get("summary", {})
+        trend_data = dashboard.get("trend", [])
         
         # 1. AI Assistant
         with st.expander("🤖 AI Transaction Assistant (NLP)"):
             st.write("Type naturally, e.g., 'Spent 500 dollars on Pizza' or 'Received 5000 salary'")
             
-            # Fetch wallets
-            try:
-                wallets_res = requests.get(f"{API_URL}/wallet/", headers=headers)
-                wallets = wallets_res.json() if wallets_res.status_code == 200 else []
-            except:
-                wallets = []
             wallet_options = {w['name']: w['id'] for w in wallets}
             default_wallet_id = list(wallet_options.values())[0] if wallet_options else None
 
@@ -209,8 +258,11 @@ else:
                 else:
                     st.warning("Could not understand. Try 'Spent 100 on Food'.")
 
+        for alert in st.session_state.pop("budget_alerts", []):
+            label = alert["category"] or "All categories"
+            st.warning(f"Budget alert: {label} reached {alert['threshold']:.0%} of ₹{alert['limit']:.2f} (spent ₹{alert['spent']:.2f})")
+
         # 2. Metrics
-        summary = get_summary(st.session_state["token"])
         if summary:
             c1, c2, c3, c4 = st.columns(4)
             c1.metric("Total Income", f"₹{summary.get('total_income', 0)}")
@@ -226,12 +278,23 @@ else:
             # A. Budget Progress
             with col_a:
                 st.subheader("⚠️ Monthly Budget")
-                budget = st.slider("Set Budget Limit", 1000, 100000, 20000)
-                spent = summary.get('total_expense', 0)
-                percent = min(spent / budget, 1.0)
-                st.progress(percent)
-                st.caption(f"Spent: ₹{spent} / ₹{budget}")
-                if percent >= 1.0: st.error("Over Budget!")
+                month = datetime.date.today().strftime("%Y-%m")
+                budgets = get_budgets(st.session_state["token"], month)
+                for b in budgets:
+                    label = b["category"] or "All categories"
+                    percent = b["spent"] / b["limit"]
+                    st.progress(min(percent, 1.0), text=label)
+                    st.caption(f"Spent: ₹{b['spent']:.2f} / ₹{b['limit']:.2f}")
+                    if percent >= 1.0: st.error(f"Over Budget: {label}!")
+                    elif percent >= 0.8: st.warning(f"{label}: {percent:.0%} of budget used")
+                with st.expander("Set budget for this month" if budgets else "Set a budget for this month"):
+                    b_category = st.text_input("Category (blank for all)", key="budget_category").strip() or None
+                    b_limit = st.number_input("Limit", min_value=1.0, value=20000.0, step=500.0, key="budget_limit")
+                    if st.button("Save Budget"):
+                        existing = next((b for b in budgets if b["category"] == b_category), None)
+                        if save_budget(st.session_state["token"], month, b_category, b_limit, existing):
+                            st.rerun()
+                        st.error("Could not save budget.")
                 
                 st.markdown("### 📊 Spending by Category")
                 cat_data = summary.get("expense_by_category", [])
@@ -249,15 +312,9 @@ else:
             # B. Monthly Trend
             with col_b:
                 st.subheader("📈 Monthly Trends")
-                try:
-                    trend_res = requests.get(f"{API_URL}/report/trend", headers=headers)
-                    trend_data = trend_res.json() if trend_res.status_code == 200 else []
-                except:
-                    trend_data = []
-
                 if trend_data:
                     df_trend = pd.DataFrame(trend_data)
-                    st.bar_chart(df_trend.set_index("month")[["income", "expense"]])
+                    st.bar_chart(df_trend.set_index("period")[["income", "expense"]])
                 else:
                     st.info("Not enough data for trends.")
 
@@ -266,11 +323,9 @@ else:
                 st.subheader("📂 Data Export")
                 if st.button("Generate CSV Report"):
                     try:
-                        export_res = requests.get(f"{API_URL}/report/export", headers=headers)
+                        export_res = http.get(f"{API_URL}/report/export", params={"format": "csv"}, headers=headers)
                         if export_res.status_code == 200:
-                            df_export = pd.DataFrame(export_res.json())
-                            csv = df_export.to_csv(index=False).encode('utf-8')
-                            st.download_button("📥 Download CSV", csv, "wisemoney_data.csv", "text/csv")
+                            st.download_button("📥 Download CSV", export_res.content, "wisemoney_data.csv", "text/csv")
                         else:
                             st.error("Export failed.")
                     except:
@@ -281,11 +336,7 @@ else:
     
     elif page == "Add Transaction":
         st.header("Add New Transaction")
-        try:
-            wallets_res = requests.get(f"{API_URL}/wallet/", headers=headers)
-            wallets = wallets_res.json() if wallets_res.status_code == 200 else []
-        except:
-            wallets = []
+        wallets = get_wallets(st.session_state["token"])
         wallet_options = {w['name']: w['id'] for w in wallets}
         
         c1, c2 = st.columns(2)
@@ -316,13 +367,28 @@ else:
 
     elif page == "ML Forecast":
         st.header("🔮 AI Spending Forecaster")
-        st.write("Predicts your future daily spending based on historical regression.")
+        st.write("Predicts your daily spending per category from its trend and day-of-week pattern, with a ~95% range.")
         if st.button("Run Forecast"):
             with st.spinner("Processing..."):
-                f_data = get_forecast(st.session_state["token"])
+                f_res = get_forecast(st.session_state["token"])
+            f_data = f_res.get("forecast", [])
             if f_data:
-                df = pd.DataFrame(f_data)
-                st.line_chart(df.set_index("date")["predicted_amount"])
+                df = pd.DataFrame(f_data).set_index("date")
+                st.subheader("Total")
+                st.line_chart(df[["lower", "predicted_amount", "upper"]])
+                if f_res.get("model") == "trend":
+                    st.caption("Less than two weeks of history: weekday patterns are not modelled yet.")
+
+                by_cat = f_res.get("by_category", {})
+                if by_cat:
+                    st.subheader("By Category")
+                    cat_df = pd.DataFrame({
+                        cat: {p["date"]: p["predicted_amount"] for p in points}
+                        for cat, points in by_cat.items()
+                    })
+                    st.area_chart(cat_df)
+                    totals = cat_df.sum().sort_values(ascending=False).rename("Forecast total")
+                    st.dataframe(totals)
                 st.dataframe(df)
             else:
                 st.warning("Need more data points for accurate prediction.")
@@ -1,13 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import SessionLocal, AsyncSessionLocal
+from executor import run_cpu
 from models import User
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 import os
+import time
+from cache import TTLCache
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -17,6 +21,15 @@ SECRET_KEY = os.getenv("SECRET_KEY", "mysecretkey")  # Change in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Authenticated user cache (token -> user identity).
+# Entries are evicted when User.is_active or User.password_hash is set through the
+# ORM in this process. A deactivation or password reset done with a plain SQL
+# UPDATE, or in another worker, leaves cached tokens valid for up to
+# AUTH_CACHE_TTL_SECONDS (never past the token's own exp); lower it if that matters.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "4096"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+auth_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS, name="auth")
+
 # Pydantic models
 class UserCreate(BaseModel):
     name: str
@@ -35,6 +48,11 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get an async DB session (async routes)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 router = APIRouter()
 
 # Utility functions
@@ -52,29 +70,53 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 # Routes
+# bcrypt runs on the CPU executor so logins never hold the event loop or the sync threadpool
 @router.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user.email).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_user = await db.scalar(select(User).where(User.email == user.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_pw = hash_password(user.password)
+    hashed_pw = await run_cpu(hash_password, user.password)
     new_user = User(name=user.name, email=user.email, password_hash=hashed_pw)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     return {"message": "User registered successfully"}
 
 @router.post("/login")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.password_hash):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
+    if not db_user or not await run_cpu(verify_password, user.password, db_user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     access_token = create_access_token({"sub": db_user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+class AuthenticatedUser:
+    """Detached snapshot of the columns routes need from the logged-in user."""
+    __slots__ = ("id", "name", "email", "is_active")
+
+    def __init__(self, id: int, name: str, email: str, is_active: bool = True):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.is_active = is_active
+
+def invalidate_user(user_id: int):
+    # Drop every cached token that resolves to this user
+    return auth_cache.discard_where(lambda cached: cached.id == user_id)
+
+@event.listens_for(User.is_active, "set")
+@event.listens_for(User.password_hash, "set")
+def _invalidate_on_credential_change(target, value, oldvalue, initiator):
+    if target.id is not None:
+        invalidate_user(target.id)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    cached = auth_cache.get(token)
+    if cached is not None:
+        return cached
+
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -87,7 +129,15 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    user = await db.scalar(select(User).where(User.email == email))
+    if user is None or user.is_active is False:
         raise credentials_exception
-    return user
+
+    current_user = AuthenticatedUser(user.id, user.name, user.email, user.is_active)
+    # Never cache a token past its own expiry
+    ttl = AUTH_CACHE_TTL_SECONDS
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        auth_cache.set(token, current_user, ttl=ttl)
+    return current_user
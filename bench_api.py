@@ -0,0 +1,186 @@
+
+"""
+In-process load test and latency benchmark for the API.
+
+Boots main.app against a temporary SQLite database filled by seed_data.seed,
+drives the auth, CRUD, report, forecast and NLP endpoints at a fixed
+concurrency, and reports throughput plus p50/p95/p99 latency per route.
+
+Usage:
+    python bench_api.py [--users 20] [--days 365] [--per-day 2] [--concurrency 16]
+                        [--requests 2000] [--out bench_results.json]
+                        [--compare baseline.json] [--threshold 0.25]
+
+With --compare, routes whose p95 grew by more than --threshold (fractional)
+over the baseline are listed and the process exits with status 1.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+PASSWORD = "benchpass"
+NLP_LINES = ["spent 250 on groceries", "received 5000 salary", "paid 120.50 for uber", "bought coffee for 4"]
+
+# seed_data numbers seed users from 0; in the empty bench database user n gets id n + 1 and wallet n + 1
+def bench_email(user_id: int) -> str:
+    from seed_data import seed_email
+    return seed_email(user_id - 1)
+
+def scenarios(rng: random.Random):
+    # (route label, method, path, json body factory); list order doubles as the weighting
+    from seed_data import CATEGORIES, SOURCES
+    today = datetime.date.today().isoformat()
+    month_start = datetime.date.today().replace(day=1).isoformat()
+    reads = [
+        ("GET /wallet/", "GET", "/wallet/", None),
+        ("GET /income/", "GET", "/income/?limit=50", None),
+        ("GET /expense/", "GET", "/expense/?limit=50", None),
+        ("GET /report/summary", "GET", "/report/summary", None),
+        ("GET /report/summary?from", "GET", f"/report/summary?from={month_start}", None),
+        ("GET /report/trend", "GET", "/report/trend?granularity=month", None),
+        ("GET /report/dashboard", "GET", "/report/dashboard", None),
+        ("GET /report/forecast", "GET", "/report/forecast", None),
+    ]
+    writes = [
+        ("POST /expense/", "POST", "/expense/",
+         lambda user: {"amount": round(rng.uniform(5, 300), 2), "category": rng.choice(CATEGORIES), "date": today, "wallet_id": user}),
+        ("POST /income/", "POST", "/income/",
+         lambda user: {"amount": round(rng.uniform(100, 3000), 2), "source": rng.choice(SOURCES), "date": today, "wallet_id": user}),
+    ]
+    nlp = [
+        ("POST /nlp/parse", "POST", "/nlp/parse", lambda user: {"text": rng.choice(NLP_LINES)}),
+        ("POST /nlp/parse_batch", "POST", "/nlp/parse_batch", lambda user: {"texts": [rng.choice(NLP_LINES) for _ in range(100)]}),
+    ]
+    auth = [
+        ("POST /auth/login", "POST", "/auth/login", lambda user: {"email": bench_email(user), "password": PASSWORD}),
+    ]
+    return reads * 3 + writes * 2 + nlp + auth
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+async def drive(app, users: int, concurrency: int, total_requests: int, rng: random.Random):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tokens = {}
+        for user in range(1, users + 1):
+            res = await client.post("/auth/login", json={"email": bench_email(user), "password": PASSWORD})
+            res.raise_for_status()
+            tokens[user] = res.json()["access_token"]
+
+        mix = scenarios(rng)
+        latencies = {label: [] for label, _, _, _ in mix}
+        errors = {label: 0 for label, _, _, _ in mix}
+        counter = iter(range(total_requests))
+
+        async def worker():
+            for n in counter:
+                label, method, path, body = mix[n % len(mix)]
+                user = rng.randint(1, users)
+                headers = {"Authorization": f"Bearer {tokens[user]}"}
+                start = time.perf_counter()
+                res = await client.request(method, path, json=body(user) if body else None, headers=headers)
+                latencies[label].append((time.perf_counter() - start) * 1000)
+                if res.status_code >= 400:
+                    errors[label] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+def summarize(latencies, errors, elapsed):
+    routes = {}
+    for label, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        routes[label] = {
+            "count": len(values),
+            "errors": errors[label],
+            "mean_ms": round(statistics.fmean(values), 3),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+        }
+    total = sum(r["count"] for r in routes.values())
+    return {"elapsed_s": round(elapsed, 3), "requests": total, "throughput_rps": round(total / elapsed, 1), "routes": routes}
+
+def compare(current, baseline, threshold):
+    regressions = []
+    for label, stats in current["routes"].items():
+        before = baseline.get("routes", {}).get(label)
+        if before and before["p95_ms"] > 0 and stats["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append((label, before["p95_ms"], stats["p95_ms"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365, help="days of history per user")
+    parser.add_argument("--per-day", type=int, default=2, help="expense slots per user per day")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="baseline results JSON to check for p95 regressions")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="wisemoney-bench-")
+    # Must be set before the app modules create their engines
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    from main import app
+    from seed_data import seed
+
+    rng = random.Random(args.seed)
+    seed_start = time.perf_counter()
+    counts = seed(args.users, args.days, args.per_day, args.seed, password=PASSWORD)
+    print(f"Seeded {args.users} users, {counts['expense']} expenses and {counts['income']} incomes "
+          f"in {time.perf_counter() - seed_start:.1f}s")
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            return await drive(app, args.users, args.concurrency, args.requests, rng)
+
+    latencies, errors, elapsed = asyncio.run(run())
+    results = summarize(latencies, errors, elapsed)
+    results["config"] = vars(args)
+    results["timestamp"] = datetime.datetime.now().isoformat(timespec="seconds")
+
+    print(f"\n{results['requests']} requests in {results['elapsed_s']}s -> {results['throughput_rps']} req/s "
+          f"(concurrency {args.concurrency})\n")
+    print(f"{'route':28} {'count':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, stats in sorted(results["routes"].items()):
+        print(f"{label:28} {stats['count']:6} {stats['errors']:4} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f}")
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\np95 regressions over {args.threshold:.0%}:")
+            for label, before, after in regressions:
+                print(f"  {label}: {before:.2f} ms -> {after:.2f} ms")
+            sys.exit(1)
+        print(f"\nNo p95 regressions over {args.threshold:.0%} against {args.compare}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+
+"""
+Lines-per-second benchmark for nlp_engine.TransactionParser.
+
+Usage: python bench_nlp.py [--lines 200000] [--repeat 3]
+"""
+import argparse
+import random
+import time
+
+from nlp_engine import parser
+
+SAMPLES = [
+    "Spent 500 dollars on Pizza",
+    "Received 5000 salary",
+    "paid 120.50 for uber to airport",
+    "got 300 from mom",
+    "Rs 250 debited at Starbucks",
+    "bought groceries for 89.99",
+    "forgot to log 40 for parking",
+    "Salary 45000 credited to account",
+    "Your a/c XX1234 is debited with INR 1299.00 on Amazon purchase",
+    "no amount in this notification",
+]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--lines", type=int, default=200000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(42)
+    lines = [rng.choice(SAMPLES) for _ in range(args.lines)]
+
+    best = 0.0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        results = parser.parse_many(lines)
+        best = max(best, len(lines) / (time.perf_counter() - start))
+    parsed = sum(1 for r in results if r)
+    print(f"parse_many: {best:,.0f} lines/s (best of {args.repeat}, {len(lines):,} lines, {parsed:,} parsed)")
+
+if __name__ == "__main__":
+    main()
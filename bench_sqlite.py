@@ -0,0 +1,97 @@
+
+"""
+Mixed read/write throughput on SQLite: engine defaults vs the tuned profile
+from database.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, busy_timeout, mmap, cache).
+
+Usage: python bench_sqlite.py [--threads 8] [--writers 2] [--seconds 5] [--rows 20000]
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from database import Base, make_engine
+from models import Expense, User, Wallet
+
+CATEGORIES = ["Food", "Transport", "Rent", "Entertainment", "Utilities", "Shopping"]
+
+def prepare(engine, rows):
+    Base.metadata.create_all(bind=engine)
+    today = datetime.date.today()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "name": "Bench", "email": "bench@example.com", "password_hash": "x"}])
+        conn.execute(insert(Wallet), [{"id": 1, "user_id": 1, "name": "Main", "balance": 0}])
+        conn.execute(insert(Expense), [
+            {"user_id": 1, "wallet_id": 1, "category": random.choice(CATEGORIES),
+             "amount": round(random.uniform(1, 200), 2), "date": today - datetime.timedelta(days=i % 365)}
+            for i in range(rows)
+        ])
+
+def run(engine, threads, writers, seconds):
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+    today = datetime.date.today()
+
+    def reader():
+        done = 0
+        while time.monotonic() < stop:
+            with engine.connect() as conn:
+                conn.execute(
+                    select(Expense.category, func.sum(Expense.amount))
+                    .where(Expense.user_id == 1, Expense.date >= today - datetime.timedelta(days=30))
+                    .group_by(Expense.category)
+                ).all()
+            done += 1
+        with lock:
+            counts["reads"] += done
+
+    def writer():
+        done = errors = 0
+        while time.monotonic() < stop:
+            amount = round(random.uniform(1, 200), 2)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(Expense).values(user_id=1, wallet_id=1, category="Food", amount=amount, date=today))
+                    conn.execute(update(Wallet).where(Wallet.id == 1).values(balance=Wallet.balance - amount))
+                done += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            counts["writes"] += done
+            counts["errors"] += errors
+
+    workers = [threading.Thread(target=writer if i < writers else reader) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    for label, pragmas in [("default", {}), ("tuned", None)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", pragmas=pragmas)
+            prepare(engine, args.rows)
+            counts = run(engine, args.threads, args.writers, args.seconds)
+            engine.dispose()
+        print(
+            f"{label:8} reads/s={counts['reads'] / args.seconds:9.1f}  "
+            f"writes/s={counts['writes'] / args.seconds:8.1f}  lock errors={counts['errors']}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+
+"""
+Cold-start benchmark for the API.
+
+For each run, starts a fresh `uvicorn main:app` process against an empty
+temporary SQLite database and measures:
+  - import:     `python -c "import main"` wall time in a separate process
+  - first /:    spawn -> first successful GET /
+  - login:      spawn -> first answered POST /auth/login
+  - forecast:   latency of the first GET /report/forecast, which pays any
+                deferred ML imports
+
+Usage: python bench_startup.py [--repeat 5] [--port 8765] [--app-dir .]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+def _wait_for(client, method, path, deadline, **kwargs):
+    while time.monotonic() < deadline:
+        try:
+            return client.request(method, path, **kwargs)
+        except httpx.TransportError:
+            time.sleep(0.01)
+    raise RuntimeError(f"server did not answer {method} {path} in time")
+
+def import_time(cwd, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=cwd, env=env, check=True)
+    return time.perf_counter() - start
+
+def cold_start(app_dir, port, cwd, env):
+    base_url = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", app_dir,
+           "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    start = time.monotonic()
+    process = subprocess.Popen(cmd, cwd=cwd, env=env)
+    try:
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            deadline = start + 60
+            _wait_for(client, "GET", "/", deadline)
+            first_root = time.monotonic() - start
+            _wait_for(client, "POST", "/auth/login", deadline, json={"email": "nobody@example.com", "password": "x"})
+            first_login = time.monotonic() - start
+
+            client.post("/auth/register", json={"name": "Bench", "email": "bench@example.com", "password": "benchpass"})
+            token = client.post("/auth/login", json={"email": "bench@example.com", "password": "benchpass"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            client.post("/expense/", json={"amount": 12.5, "category": "Food"}, headers=headers)
+            forecast_start = time.monotonic()
+            client.get("/report/forecast", headers=headers).raise_for_status()
+            first_forecast = time.monotonic() - forecast_start
+    finally:
+        process.terminate()
+        process.wait()
+    return first_root, first_login, first_forecast
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--app-dir", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="checkout to measure, e.g. an older worktree for a before/after comparison")
+    args = parser.parse_args()
+    app_dir = os.path.abspath(args.app_dir)
+
+    samples = {"import": [], "first /": [], "login": [], "forecast": []}
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory(prefix="wisemoney-startup-") as tmp:
+            env = dict(os.environ, PYTHONPATH=app_dir,
+                       DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}")
+            env.pop("ASYNC_DATABASE_URL", None)
+            samples["import"].append(import_time(tmp, env))
+            first_root, first_login, first_forecast = cold_start(app_dir, args.port, tmp, env)
+            samples["first /"].append(first_root)
+            samples["login"].append(first_login)
+            samples["forecast"].append(first_forecast)
+
+    print(f"{app_dir} ({args.repeat} runs)")
+    print(f"{'':10} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for label, values in samples.items():
+        print(f"{label:10} {statistics.median(values) * 1000:10.0f} {min(values) * 1000:8.0f} {max(values) * 1000:8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Wallet balance write benchmark.
+
+Hammers one wallet from concurrent threads, each write in its own
+transaction, and compares the ORM read-modify-write the endpoints used to do
+with the single atomic UPDATE in wallet.apply_wallet_delta. Reports the final
+balance (anything short of threads x writes is a lost update) and writes/s.
+
+Usage: python bench_wallet.py [--threads 8] [--writes 50]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, make_engine
+from models import User, Wallet
+from wallet import apply_wallet_delta
+
+def read_modify_write(db):
+    wallet = db.query(Wallet).filter(Wallet.id == 1, Wallet.user_id == 1).first()
+    wallet.balance += 1
+
+def atomic_update(db):
+    apply_wallet_delta(db, 1, 1, 1)
+
+def hammer(Session, write, threads, writes):
+    def worker():
+        for _ in range(writes):
+            with Session() as db:
+                write(db)
+                db.commit()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    with Session() as db:
+        balance = db.get(Wallet, 1).balance
+        db.query(Wallet).update({Wallet.balance: 0})
+        db.commit()
+    return balance, threads * writes / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=50, help="writes per thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="wisemoney-wallet-") as tmp:
+        engine = make_engine(f"sqlite:///{os.path.join(tmp, 'wallet.db')}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine, autoflush=False)
+        with Session() as db:
+            db.add(User(id=1, name="Bench", email="bench@example.com", password_hash="x"))
+            db.add(Wallet(id=1, user_id=1, name="Main", balance=0))
+            db.commit()
+
+        print(f"{args.threads} threads x {args.writes} writes, expected balance {args.threads * args.writes}")
+        for label, write in (("read-modify-write", read_modify_write), ("atomic update", atomic_update)):
+            balance, rate = hammer(Session, write, args.threads, args.writes)
+            print(f"{label:18} balance={balance:.0f} {rate:.0f} writes/s")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
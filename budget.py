@@ -0,0 +1,171 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from collections import defaultdict
+from typing import List, Optional
+from datetime import date
+from models import Budget, DailyRollup, User
+from auth import get_async_db
+from pydantic import BaseModel, Field
+from rollups import EXPENSE
+import os
+
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+# Fractions of a limit that trigger an alert when an expense write crosses them
+BUDGET_ALERT_THRESHOLDS = tuple(sorted(float(t) for t in os.getenv("BUDGET_ALERT_THRESHOLDS", "0.8,1.0").split(",")))
+
+# Pydantic schema
+class BudgetCreate(BaseModel):
+    month: str = Field(pattern=MONTH_PATTERN)
+    category: Optional[str] = None  # None = all categories
+    limit: float = Field(gt=0)
+
+class BudgetUpdate(BaseModel):
+    limit: float = Field(gt=0)
+
+class BudgetResponse(BaseModel):
+    id: int
+    month: str
+    category: Optional[str] = None
+    limit: float
+    spent: float
+    user_id: int
+
+    class Config:
+        from_attributes = True
+
+class BudgetAlert(BaseModel):
+    budget_id: int
+    month: str
+    category: Optional[str] = None
+    limit: float
+    spent: float
+    threshold: float  # fraction of the limit that was crossed
+
+router = APIRouter()
+# Get current user
+from auth import get_current_user
+
+def month_of(day) -> str:
+    return f"{day.year:04d}-{day.month:02d}"
+
+def _month_range(month: str):
+    year, number = map(int, month.split("-"))
+    start = date(year, number, 1)
+    return start, date(year + number // 12, number % 12 + 1, 1)
+
+def add_to_budgets(db: Session, user_id: int, entries) -> List[BudgetAlert]:
+    """
+    Adds (date, category, amount) expense entries to the spend of the user's
+    matching budgets inside the caller's transaction: one indexed lookup, then
+    one atomic increment per affected budget. Returns the thresholds crossed.
+    """
+    sums = defaultdict(float)
+    for day, category, amount in entries:
+        sums[(month_of(day), category)] += amount
+    if not sums:
+        return []
+    budgets = db.execute(
+        select(Budget.id, Budget.month, Budget.category)
+        .where(Budget.user_id == user_id, Budget.month.in_({month for month, _ in sums}))
+        .order_by(Budget.id)
+    ).all()
+
+    alerts = []
+    for budget_id, month, category in budgets:
+        delta = sum(
+            amount for (entry_month, entry_category), amount in sums.items()
+            if entry_month == month and category in (None, entry_category)
+        )
+        if not delta:
+            continue
+        # The increment happens in SQL, so the returned spend includes concurrent writes
+        limit, spent = db.execute(
+            update(Budget).where(Budget.id == budget_id)
+            .values(spent=Budget.spent + delta).returning(Budget.limit, Budget.spent)
+        ).one()
+        alerts += [
+            BudgetAlert(budget_id=budget_id, month=month, category=category, limit=limit, spent=round(spent, 2), threshold=threshold)
+            for threshold in BUDGET_ALERT_THRESHOLDS
+            if spent - delta < threshold * limit <= spent
+        ]
+    return alerts
+
+def _spent_so_far(user_id: int, month: str, category: Optional[str]):
+    # Subquery over the daily rollups: a new budget starts with what the month already holds
+    start, end = _month_range(month)
+    query = select(func.coalesce(func.sum(DailyRollup.total), 0)).where(
+        DailyRollup.user_id == user_id, DailyRollup.kind == EXPENSE,
+        DailyRollup.date >= start, DailyRollup.date < end,
+    )
+    if category is not None:
+        query = query.where(DailyRollup.category == category)
+    return query.scalar_subquery()
+
+async def _get_owned(db: AsyncSession, user_id: int, budget_id: int) -> Budget:
+    budget = await db.scalar(select(Budget).where(Budget.id == budget_id, Budget.user_id == user_id))
+    if budget is None:
+        raise HTTPException(status_code=404, detail="Budget not found")
+    return budget
+
+# Create budget
+@router.post("/", response_model=BudgetResponse)
+async def create_budget(budget: BudgetCreate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    new_budget = Budget(
+        user_id=current_user.id,
+        month=budget.month,
+        category=budget.category,
+        limit=budget.limit,
+    )
+    db.add(new_budget)
+    # The unique index decides, so concurrent creates can't both succeed
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Budget already exists for this month and category")
+    # Seeded after the INSERT in the same write transaction, not from a read taken
+    # before it: an expense committed in between would otherwise be in neither the
+    # seed nor add_to_budgets, which can't see the uncommitted budget
+    await db.execute(
+        update(Budget).where(Budget.id == new_budget.id)
+        .values(spent=_spent_so_far(current_user.id, budget.month, budget.category))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    await db.refresh(new_budget)
+    return new_budget
+
+# Budgets with their current spend; a read of stored counters, no aggregation over expenses
+@router.get("/", response_model=List[BudgetResponse])
+async def get_budgets(
+    month: Optional[str] = Query(None, pattern=MONTH_PATTERN),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    query = select(Budget).where(Budget.user_id == current_user.id)
+    if month:
+        query = query.where(Budget.month == month)
+    budgets = await db.scalars(query.order_by(Budget.month.desc(), Budget.category))
+    return budgets.all()
+
+@router.get("/{budget_id}", response_model=BudgetResponse)
+async def get_budget(budget_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    return await _get_owned(db, current_user.id, budget_id)
+
+# Change a budget's limit; month and category define the budget, so they are fixed
+@router.put("/{budget_id}", response_model=BudgetResponse)
+async def update_budget(budget_id: int, changes: BudgetUpdate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    budget = await _get_owned(db, current_user.id, budget_id)
+    budget.limit = changes.limit
+    await db.commit()
+    return budget
+
+@router.delete("/{budget_id}", status_code=204)
+async def delete_budget(budget_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    await db.delete(await _get_owned(db, current_user.id, budget_id))
+    await db.commit()
+    return Response(status_code=204)
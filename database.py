@@ -1,23 +1,107 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Connection, create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
-DATABASE_URL = "sqlite:///./wisemoney_fixed.db" # Force new DB for debugging
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./wisemoney_fixed.db")
+
+# Pool settings (ignored for in-memory SQLite, which uses a single connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+
+# SQLite production profile, applied to every new connection.
+# WAL lets readers proceed while a writer commits; busy_timeout makes writers
+# wait for the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, i.e. 64 MiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/") in ("sqlite:", "sqlite+aiosqlite:"))
+
+def _engine_kwargs(url: str) -> dict:
+    kwargs = {"echo": DB_ECHO}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if not _is_memory_sqlite(url):
+        kwargs.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=not url.startswith("sqlite"),
+        )
+    return kwargs
+
+def apply_sqlite_pragmas(sync_engine, pragmas: dict = None):
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def make_engine(url: str, pragmas: dict = None):
+    """Sync engine with pool settings and, for SQLite, the tuned connection profile."""
+    new_engine = create_engine(url, **_engine_kwargs(url))
+    if url.startswith("sqlite"):
+        apply_sqlite_pragmas(new_engine, pragmas)
+    return new_engine
 
 # SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+engine = make_engine(DATABASE_URL)
 
 # Create a session
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Async engine on the same database for async routes (aiosqlite / asyncpg drivers)
+def to_async_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs(ASYNC_DATABASE_URL))
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    apply_sqlite_pragmas(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# INSERT ... ON CONFLICT constructs for dialects that have one; others get None
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def dialect_name(db) -> str:
+    """Dialect name for a Session or a Connection."""
+    return db.dialect.name if isinstance(db, Connection) else db.get_bind().dialect.name
+
+def upsert_insert(db):
+    """The dialect's insert() supporting on_conflict_do_update for a Session's or Connection's bind, or None."""
+    return _UPSERT_INSERTS.get(dialect_name(db))
+
 # Base class for models
 Base = declarative_base()
 
 # Initialize DB (creates tables)
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add any newer indexes explicitly.
+    # IF NOT EXISTS rather than checkfirst: reflection doesn't see expression indexes
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
@@ -0,0 +1,24 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Dedicated, bounded pools for CPU-heavy work so it never occupies the threadpool
+# that serves sync routes or blocks the event loop. bcrypt and model fits get
+# separate pools: a login spike must not queue forecasts behind password hashes.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+ML_WORKERS = int(os.getenv("ML_WORKERS", "2"))
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="wisemoney-cpu")
+ml_executor = ThreadPoolExecutor(max_workers=ML_WORKERS, thread_name_prefix="wisemoney-ml")
+
+async def _run_in(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+async def run_cpu(func, *args, **kwargs):
+    """Password hashing and other per-request CPU work."""
+    return await _run_in(cpu_executor, func, *args, **kwargs)
+
+async def run_ml(func, *args, **kwargs):
+    """Model fitting."""
+    return await _run_in(ml_executor, func, *args, **kwargs)
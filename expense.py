@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from sqlalchemy import insert
+from collections import defaultdict
+from typing import List, Optional
+from datetime import datetime, date
 from database import SessionLocal
 from models import Expense, User
 from auth import get_db, SECRET_KEY, ALGORITHM
 from jose import jwt, JWTError
 from pydantic import BaseModel
+from pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from wallet import apply_wallet_delta, apply_wallet_deltas
+from versioning import bump_version, EXPENSES
+from rollups import add_to_rollups, EXPENSE
+from anomalies import record_expenses
+from budget import BudgetAlert, add_to_budgets
 from fastapi.security import OAuth2PasswordBearer
 
 # Pydantic schema
@@ -14,7 +22,7 @@ class ExpenseCreate(BaseModel):
     amount: float
     category: str
     date: datetime = datetime.utcnow()
-    wallet_id: int = None
+    wallet_id: Optional[int] = None
 
 class ExpenseResponse(BaseModel):
     id: int
@@ -22,19 +30,32 @@ class ExpenseResponse(BaseModel):
     category: str
     date: datetime
     user_id: int
-    wallet_id: int = None
+    wallet_id: Optional[int] = None
 
     class Config:
         from_attributes = True
 
+# Only the create endpoint scores the expense, so only its response carries the result
+class ExpenseCreatedResponse(ExpenseResponse):
+    # Deviations above the user's usual amount for the category; None when not scored
+    anomaly_score: Optional[float] = None
+    # Budget thresholds this expense pushed spending past
+    budget_alerts: List[BudgetAlert] = []
+
 router = APIRouter()
 
+MAX_BATCH_SIZE = 5000
+
 # Get current user
 from auth import get_current_user
 
 # Create expense
-@router.post("/", response_model=ExpenseResponse)
+@router.post("/", response_model=ExpenseCreatedResponse)
 def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Balance first: a single atomic UPDATE that also checks wallet ownership
+    if expense.wallet_id:
+        apply_wallet_delta(db, current_user.id, expense.wallet_id, -expense.amount)
+
     new_expense = Expense(
         amount=expense.amount,
         category=expense.category,
@@ -43,22 +64,73 @@ def create_expense(expense: ExpenseCreate, db: Session = Depends(get_db), curren
         wallet_id=expense.wallet_id
     )
     db.add(new_expense)
-    
-    # Update wallet balance if wallet_id is provided
-    if expense.wallet_id:
-        from models import Wallet
-        wallet = db.query(Wallet).filter(Wallet.id == expense.wallet_id, Wallet.user_id == current_user.id).first()
-        if wallet:
-            wallet.balance -= expense.amount
-        else:
-            raise HTTPException(status_code=404, detail="Wallet not found")
+    db.flush()
 
+    bump_version(db, current_user.id, EXPENSES)
+    add_to_rollups(db, current_user.id, EXPENSE, [(expense.date, expense.category, expense.amount)])
+    [score] = record_expenses(db, current_user.id, [(new_expense.id, expense.date, expense.category, expense.amount)])
+    alerts = add_to_budgets(db, current_user.id, [(expense.date, expense.category, expense.amount)])
     db.commit()
     db.refresh(new_expense)
-    return new_expense
+    response = ExpenseCreatedResponse.model_validate(new_expense)
+    response.anomaly_score = round(score, 2) if score is not None else None
+    response.budget_alerts = alerts
+    return response
+
+def bulk_insert_expenses(db: Session, user_id: int, items: List[ExpenseCreate]):
+    """
+    Inserts many expenses with one executemany and applies one net balance
+    change per affected wallet. Returns the new ids in input order and the
+    budget alerts the batch triggered; caller commits.
+    """
+    rows = [
+        {"amount": item.amount, "category": item.category, "date": item.date, "user_id": user_id, "wallet_id": item.wallet_id}
+        for item in items
+    ]
+    deltas = defaultdict(float)
+    for item in items:
+        if item.wallet_id:
+            deltas[item.wallet_id] -= item.amount
+    apply_wallet_deltas(db, user_id, deltas)
+    bump_version(db, user_id, EXPENSES)
+    add_to_rollups(db, user_id, EXPENSE, ((item.date, item.category, item.amount) for item in items))
+    ids = list(db.scalars(insert(Expense).returning(Expense.id, sort_by_parameter_order=True), rows))
+    record_expenses(db, user_id, ((id_, item.date, item.category, item.amount) for id_, item in zip(ids, items)))
+    alerts = add_to_budgets(db, user_id, ((item.date, item.category, item.amount) for item in items))
+    return ids, alerts
+
+# Create many expenses in one transaction
+@router.post("/batch")
+def create_expenses_batch(expenses: List[ExpenseCreate], db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if len(expenses) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_SIZE})")
+    ids, alerts = bulk_insert_expenses(db, current_user.id, expenses) if expenses else ([], [])
+    db.commit()
+    return {"inserted": len(ids), "ids": ids, "budget_alerts": alerts}
 
-# Get all expenses for current user
+# Get expenses for current user, newest first, one keyset page at a time
 @router.get("/", response_model=List[ExpenseResponse])
-def get_expenses(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    expenses = db.query(Expense).filter(Expense.user_id == current_user.id).all()
+def get_expenses(
+    response: Response,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    category: Optional[str] = None,
+    wallet_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    query = db.query(Expense).filter(Expense.user_id == current_user.id)
+    if date_from:
+        query = query.filter(Expense.date >= date_from)
+    if date_to:
+        query = query.filter(Expense.date <= date_to)
+    if category:
+        query = query.filter(Expense.category == category)
+    if wallet_id:
+        query = query.filter(Expense.wallet_id == wallet_id)
+    expenses, next_cursor = paginate(query, Expense.date, Expense.id, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return expenses
@@ -0,0 +1,216 @@
+import csv
+import io
+import re
+from collections import Counter
+from datetime import date, datetime, time
+from typing import Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Session
+from models import Income, Expense, User, Wallet
+from auth import get_db, get_current_user
+from income import IncomeCreate, bulk_insert_incomes
+from expense import ExpenseCreate, bulk_insert_expenses
+from nlp_engine import parser
+
+router = APIRouter()
+
+# Lines handled per parse / dedupe / insert / commit cycle; bounds memory for any file size
+CHUNK_LINES = 2000
+# Rejected rows listed in the summary; the rest are only counted under "skipped"
+MAX_REPORTED_ERRORS = 20
+# Keys per dedupe lookup; up to four bound parameters each, under SQLite's 999 limit
+DEDUPE_BATCH_KEYS = 240
+
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%m/%d/%Y")
+DESCRIPTION_COLUMNS = ("description", "category", "source", "narration", "details", "particulars")
+LEADING_DATE = re.compile(r"^\s*(\d{4}-\d{2}-\d{2}|\d{1,2}[/-]\d{1,2}[/-]\d{4})[\s,;:-]*")
+
+def _parse_date(value: str) -> Optional[date]:
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def _parse_amount(value) -> Optional[float]:
+    # Empty -> None; anything else that isn't a number rejects the row
+    if value is None:
+        return None
+    text = str(value).strip().replace(",", "")
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"Unrecognised amount {str(value).strip()!r}")
+
+def _text_rows(lines, today: date):
+    # Free text: optional leading date, the rest goes through the NLP parser
+    dates, bodies = [], []
+    for line in lines:
+        match = LEADING_DATE.match(line)
+        dates.append((_parse_date(match.group(1)) if match else None) or today)
+        bodies.append(line[match.end():] if match else line)
+    for row_date, parsed in zip(dates, parser.parse_many(bodies)):
+        if parsed and parsed["amount"]:
+            yield parsed["type"], row_date, parsed["amount"], parsed["category"]
+        else:
+            yield None
+
+def _csv_row(record: dict, today: date):
+    # Accepts either a signed amount (+ optional type) or separate debit/credit columns.
+    # A missing date means today; a date or amount that doesn't parse rejects the row.
+    raw_date = (record.get("date") or "").strip()
+    row_date = _parse_date(raw_date) if raw_date else today
+    if row_date is None:
+        raise ValueError(f"Unrecognised date {raw_date!r}")
+    description = next((record[c].strip() for c in DESCRIPTION_COLUMNS if record.get(c)), "Uncategorized")
+    debit, credit = _parse_amount(record.get("debit")), _parse_amount(record.get("credit"))
+    if debit or credit:
+        kind, amount = ("Expense", debit) if debit else ("Income", credit)
+    else:
+        amount = _parse_amount(record.get("amount"))
+        if not amount:
+            return None
+        type_ = (record.get("type") or "").strip().lower()
+        if type_ in ("income", "credit", "cr"):
+            kind = "Income"
+        elif type_ in ("expense", "debit", "dr"):
+            kind = "Expense"
+        else:
+            kind = "Income" if amount > 0 else "Expense"
+    return kind, row_date, abs(amount), description
+
+def _csv_rows(reader, today: date, summary: dict):
+    for record in reader:
+        try:
+            yield _csv_row(record, today)
+        except ValueError as exc:
+            if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                summary["errors"].append({"line": reader.line_num, "detail": str(exc)})
+            yield None
+
+def _last_ids(db: Session):
+    # Rows above these ids were written by this import (or concurrently) and never count as already stored
+    return {model: db.scalar(select(func.coalesce(func.max(model.id), 0))) for model in (Income, Expense)}
+
+def _existing_keys(db: Session, user_id: int, keys, last_ids: dict):
+    """
+    Counts of the given (kind, date, amount, description) keys among rows stored
+    before the import started. Only the chunk's own keys are looked up, through
+    the (user_id, date, amount, description) indexes, so cost and memory follow
+    the chunk, not the user's history or the statement's date span.
+    """
+    found = Counter()
+    for kind, model, description in (("Income", Income, Income.source), ("Expense", Expense, Expense.category)):
+        wanted = [key[1:] for key in keys if key[0] == kind]
+        for batch in _chunks(wanted, DEDUPE_BATCH_KEYS):
+            rows = db.execute(
+                select(model.date, model.amount, description)
+                .where(
+                    model.user_id == user_id, model.id <= last_ids[model],
+                    # The date list lets the index seek on (user_id, date); the tuple picks exact keys
+                    model.date.in_({key[0] for key in batch}),
+                    tuple_(model.date, model.amount, description).in_(batch),
+                )
+            )
+            found.update((kind, d, round(a, 2), desc) for d, a, desc in rows)
+    return found
+
+def _import_chunk(db: Session, user_id: int, rows, wallet_id: Optional[int], last_ids: dict, summary: dict):
+    candidates = [row for row in rows if row is not None]
+    summary["skipped"] += len(rows) - len(candidates)
+    if not candidates:
+        return
+    keys = [(kind, row_date, round(amount, 2), description) for kind, row_date, amount, description in candidates]
+    stored = _existing_keys(db, user_id, set(keys), last_ids)
+
+    # Identical transactions can be real (two coffees in a day): skip only as many as are already stored
+    incomes, expenses = [], []
+    for key, (kind, row_date, amount, description) in zip(keys, candidates):
+        if stored[key] > 0:
+            stored[key] -= 1
+            summary["duplicates"] += 1
+            continue
+        when = datetime.combine(row_date, time())
+        if kind == "Income":
+            incomes.append(IncomeCreate(amount=amount, source=description, date=when, wallet_id=wallet_id))
+        else:
+            expenses.append(ExpenseCreate(amount=amount, category=description, date=when, wallet_id=wallet_id))
+
+    if incomes:
+        bulk_insert_incomes(db, user_id, incomes)
+    if expenses:
+        bulk_insert_expenses(db, user_id, expenses)
+    db.commit()
+    summary["inserted"]["income"] += len(incomes)
+    summary["inserted"]["expense"] += len(expenses)
+
+def _chunks(iterable, size: int):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+@router.post("/statement")
+def import_statement(
+    file: UploadFile = File(...),
+    format: str = Query("auto", pattern="^(auto|csv|text)$"),
+    wallet_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Imports a bank statement (CSV or one transaction per line of free text).
+    The upload is streamed and committed in chunks of CHUNK_LINES; rows already
+    stored for the same (date, amount, description) are skipped, as many times
+    as they are stored. CSV rows with an unparseable date or amount are skipped
+    and listed under "errors".
+    """
+    if wallet_id and db.scalar(select(Wallet.id).where(Wallet.id == wallet_id, Wallet.user_id == current_user.id)) is None:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+    if format == "auto":
+        format = "csv" if (file.filename or "").lower().endswith(".csv") or file.content_type == "text/csv" else "text"
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", errors="replace", newline="")
+    today = date.today()
+    last_ids = _last_ids(db)
+    summary = {
+        "format": format,
+        "lines": 0,
+        "skipped": 0,
+        "duplicates": 0,
+        "inserted": {"income": 0, "expense": 0},
+        "errors": [],
+        "progress": [],
+    }
+
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        if not reader.fieldnames:
+            raise HTTPException(status_code=400, detail="CSV file has no header row")
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        if "amount" not in reader.fieldnames and not {"debit", "credit"} & set(reader.fieldnames):
+            raise HTTPException(status_code=400, detail="CSV needs an 'amount' column or 'debit'/'credit' columns")
+        chunks = _chunks(_csv_rows(reader, today, summary), CHUNK_LINES)
+    else:
+        lines = (line for line in (raw.strip() for raw in stream) if line)
+        chunks = (list(_text_rows(chunk, today)) for chunk in _chunks(lines, CHUNK_LINES))
+
+    for rows in chunks:
+        summary["lines"] += len(rows)
+        _import_chunk(db, current_user.id, rows, wallet_id, last_ids, summary)
+        summary["progress"].append({
+            "lines": summary["lines"],
+            "inserted": summary["inserted"]["income"] + summary["inserted"]["expense"],
+        })
+
+    stream.detach()
+    return summary
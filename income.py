@@ -1,20 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from auth import get_current_user
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from sqlalchemy import insert
+from collections import defaultdict
+from typing import List, Optional
+from datetime import datetime, date
 from database import SessionLocal
 from models import Income, User
 from auth import get_db, create_access_token, SECRET_KEY, ALGORITHM
 from jose import jwt, JWTError
 from pydantic import BaseModel
+from pagination import paginate, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from wallet import apply_wallet_delta, apply_wallet_deltas
+from versioning import bump_version, INCOMES
+from rollups import add_to_rollups, INCOME
 
 # Pydantic schema
 class IncomeCreate(BaseModel):
     amount: float
     source: str
     date: datetime = datetime.utcnow()
-    wallet_id: int = None
+    wallet_id: Optional[int] = None
 
 class IncomeResponse(BaseModel):
     id: int
@@ -22,16 +28,22 @@ class IncomeResponse(BaseModel):
     source: str
     date: datetime
     user_id: int
-    wallet_id: int = None
+    wallet_id: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 router = APIRouter()
 
+MAX_BATCH_SIZE = 5000
+
 # Create new income
 @router.post("/", response_model=IncomeResponse)
 def create_income(income: IncomeCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Balance first: a single atomic UPDATE that also checks wallet ownership
+    if income.wallet_id:
+        apply_wallet_delta(db, current_user.id, income.wallet_id, income.amount)
+
     new_income = Income(
         amount=income.amount,
         source=income.source,
@@ -40,22 +52,63 @@ def create_income(income: IncomeCreate, db: Session = Depends(get_db), current_u
         wallet_id=income.wallet_id
     )
     db.add(new_income)
-    
-    # Update wallet balance if wallet_id is provided
-    if income.wallet_id:
-        from models import Wallet
-        wallet = db.query(Wallet).filter(Wallet.id == income.wallet_id, Wallet.user_id == current_user.id).first()
-        if wallet:
-            wallet.balance += income.amount
-        else:
-            raise HTTPException(status_code=404, detail="Wallet not found")
 
+    bump_version(db, current_user.id, INCOMES)
+    add_to_rollups(db, current_user.id, INCOME, [(income.date, income.source, income.amount)])
     db.commit()
     db.refresh(new_income)
     return new_income
 
-# Get all incomes for current user
+def bulk_insert_incomes(db: Session, user_id: int, items: List[IncomeCreate]):
+    """
+    Inserts many incomes with one executemany and applies one net balance
+    change per affected wallet. Returns the new ids in input order; caller commits.
+    """
+    rows = [
+        {"amount": item.amount, "source": item.source, "date": item.date, "user_id": user_id, "wallet_id": item.wallet_id}
+        for item in items
+    ]
+    deltas = defaultdict(float)
+    for item in items:
+        if item.wallet_id:
+            deltas[item.wallet_id] += item.amount
+    apply_wallet_deltas(db, user_id, deltas)
+    bump_version(db, user_id, INCOMES)
+    add_to_rollups(db, user_id, INCOME, ((item.date, item.source, item.amount) for item in items))
+    return list(db.scalars(insert(Income).returning(Income.id, sort_by_parameter_order=True), rows))
+
+# Create many incomes in one transaction
+@router.post("/batch")
+def create_incomes_batch(incomes: List[IncomeCreate], db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if len(incomes) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_SIZE})")
+    ids = bulk_insert_incomes(db, current_user.id, incomes) if incomes else []
+    db.commit()
+    return {"inserted": len(ids), "ids": ids}
+
+# Get incomes for current user, newest first, one keyset page at a time
 @router.get("/", response_model=List[IncomeResponse])
-def get_incomes(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    incomes = db.query(Income).filter(Income.user_id == current_user.id).all()
+def get_incomes(
+    response: Response,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    source: Optional[str] = None,
+    wallet_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    query = db.query(Income).filter(Income.user_id == current_user.id)
+    if date_from:
+        query = query.filter(Income.date >= date_from)
+    if date_to:
+        query = query.filter(Income.date <= date_to)
+    if source:
+        query = query.filter(Income.source == source)
+    if wallet_id:
+        query = query.filter(Income.wallet_id == wallet_id)
+    incomes, next_cursor = paginate(query, Income.date, Income.id, cursor, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return incomes
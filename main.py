@@ -1,28 +1,88 @@
+import asyncio
+import contextlib
+import logging
+import os
 from fastapi import FastAPI
 from auth import router as auth_router
-from database import Base, engine
+from database import init_db, SessionLocal
 from models import User, Income, Expense, Wallet
 from income import router as income_router
 from expense import router as expense_router
 from wallet import router as wallet_router
+from budget import router as budget_router
 from fastapi.security import OAuth2PasswordBearer
 from report import router as report_router
 from nlp_engine import router as nlp_router
+from importer import router as import_router
+from fastapi.responses import PlainTextResponse
+from metrics import MetricsMiddleware, metrics
+from executor import run_ml
+from rollups import backfill_if_needed as backfill_rollups
+from anomalies import backfill_if_needed as backfill_expense_stats
+from precompute import FORECAST_SCHEDULER, scheduler as forecast_scheduler
 
-# Initialize database tables
-Base.metadata.create_all(bind=engine)
+# Forecast fits to preload in the background after startup (most recently active users); 0 disables
+WARMUP_FORECAST_USERS = int(os.getenv("WARMUP_FORECAST_USERS", "0"))
+
+log = logging.getLogger("wisemoney.startup")
+
+def _preload_forecasts():
+    # Deferred import: numpy loads here or on the first forecast, never at startup
+    from ml_engine import preload_forecasts
+    with SessionLocal() as db:
+        return preload_forecasts(db, WARMUP_FORECAST_USERS)
+
+def _warmup_done(task: asyncio.Task):
+    # Nothing awaits the warmup, so its outcome is reported here
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        log.error("Forecast warmup failed", exc_info=task.exception())
+    else:
+        log.info("Preloaded forecasts for %d users", task.result())
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Initialize database tables and indexes; rollups and expense stats are built once for data that predates them
+    init_db()
+    with SessionLocal() as db:
+        rollups_built = backfill_rollups(db)
+        stats_built = backfill_expense_stats(db)
+        if rollups_built or stats_built:
+            db.commit()
+    # Started as a task so the server accepts requests while it runs
+    warmup = None
+    if WARMUP_FORECAST_USERS > 0:
+        warmup = asyncio.create_task(run_ml(_preload_forecasts))
+        warmup.add_done_callback(_warmup_done)
+    # Keeps the forecasts table current for users whose expenses changed; one process per deployment
+    if FORECAST_SCHEDULER:
+        forecast_scheduler.start()
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await forecast_scheduler.stop()
 
 app = FastAPI(
     title="WiseMoney Backend",
     description="API for user authentication and finance tracking",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Per-route latency, status and SQL counters, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Root route
 @app.get("/")
 def root():
     return {"message": "Test server running"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Register authentication routes
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 
@@ -32,6 +92,10 @@ app.include_router(expense_router, prefix="/expense", tags=["Expense"])
 
 app.include_router(wallet_router, prefix="/wallet", tags=["Wallet"])
 
+app.include_router(budget_router, prefix="/budget", tags=["Budget"])
+
 app.include_router(report_router, prefix="/report", tags=["Report"])
 
-app.include_router(nlp_router, prefix="/nlp", tags=["NLP"])
\ No newline at end of file
+app.include_router(nlp_router, prefix="/nlp", tags=["NLP"])
+
+app.include_router(import_router, prefix="/import", tags=["Import"])
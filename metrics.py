@@ -0,0 +1,232 @@
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+import cache
+from database import engine, async_engine
+
+# Requests slower than this are logged with the SQL they issued; 0 disables the log
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_LOG_MAX_STATEMENTS = int(os.getenv("SLOW_LOG_MAX_STATEMENTS", "50"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+slow_log = logging.getLogger("wisemoney.slow_requests")
+
+
+class RequestStats:
+    """SQL activity of the request being served; shared with threadpool and greenlet work via contextvars."""
+    __slots__ = ("queries", "db_errors", "db_time", "statements")
+
+    def __init__(self, record_statements: bool = False):
+        self.queries = 0
+        self.db_errors = 0
+        self.db_time = 0.0
+        self.statements = [] if record_statements else None
+
+
+_current_request = ContextVar("wisemoney_request_stats", default=None)
+
+
+# The start time lives on the statement's execution context, so a statement that
+# raises (and never reaches after_cursor_execute) leaves nothing behind on the connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._wisemoney_query_start = time.perf_counter()
+
+
+def _record(context, statement, failed=False):
+    start = getattr(context, "_wisemoney_query_start", None)
+    stats = _current_request.get()
+    if start is None or stats is None:
+        return
+    elapsed = time.perf_counter() - start
+    stats.queries += 1
+    stats.db_errors += failed
+    stats.db_time += elapsed
+    if stats.statements is not None and len(stats.statements) < SLOW_LOG_MAX_STATEMENTS:
+        stats.statements.append((elapsed, statement))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _record(context, statement)
+
+
+def _handle_error(exception_context):
+    _record(exception_context.execution_context, exception_context.statement, failed=True)
+
+
+for _engine in (engine, async_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(_engine, "handle_error", _handle_error)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, buckets, value):
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """In-process registry for request and SQL metrics, rendered as Prometheus text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}       # (method, route) -> _Histogram of seconds
+        self.queries = {}       # (method, route) -> _Histogram of queries per request
+        self.db_seconds = {}    # (method, route) -> total seconds spent in SQL
+        self.db_errors = {}     # (method, route) -> SQL statements that raised
+        self.responses = {}     # (method, route, status) -> count
+
+    def observe(self, method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = _Histogram(LATENCY_BUCKETS)
+                self.queries[key] = _Histogram(QUERY_BUCKETS)
+                self.db_seconds[key] = 0.0
+                self.db_errors[key] = 0
+            self.latency[key].observe(LATENCY_BUCKETS, elapsed)
+            self.queries[key].observe(QUERY_BUCKETS, stats.queries)
+            self.db_seconds[key] += stats.db_time
+            self.db_errors[key] += stats.db_errors
+            status_key = (method, route, status)
+            self.responses[status_key] = self.responses.get(status_key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.latency.clear()
+            self.queries.clear()
+            self.db_seconds.clear()
+            self.db_errors.clear()
+            self.responses.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            lines += _render_histogram("wisemoney_http_request_duration_seconds",
+                                       "Request latency by route.", LATENCY_BUCKETS, self.latency)
+            lines += _render_histogram("wisemoney_db_queries_per_request",
+                                       "SQL statements issued per request.", QUERY_BUCKETS, self.queries)
+            lines += [
+                "# HELP wisemoney_db_seconds_total Time spent executing SQL by route.",
+                "# TYPE wisemoney_db_seconds_total counter",
+            ]
+            for (method, route), seconds in sorted(self.db_seconds.items()):
+                lines.append(f"wisemoney_db_seconds_total{{{_labels(method=method, route=route)}}} {seconds:.6f}")
+            lines += [
+                "# HELP wisemoney_db_errors_total SQL statements that raised, by route.",
+                "# TYPE wisemoney_db_errors_total counter",
+            ]
+            for (method, route), count in sorted(self.db_errors.items()):
+                lines.append(f"wisemoney_db_errors_total{{{_labels(method=method, route=route)}}} {count}")
+            lines += [
+                "# HELP wisemoney_http_responses_total Responses by route and status code.",
+                "# TYPE wisemoney_http_responses_total counter",
+            ]
+            for (method, route, status), count in sorted(self.responses.items()):
+                lines.append(f"wisemoney_http_responses_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+
+        caches = sorted(cache.registry.items())
+        for name, help_text, field in (
+            ("wisemoney_cache_hits_total", "Cache hits.", "hits"),
+            ("wisemoney_cache_misses_total", "Cache misses.", "misses"),
+            ("wisemoney_cache_entries", "Entries currently cached.", "size"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {'gauge' if field == 'size' else 'counter'}"]
+            for cache_name, instance in caches:
+                lines.append(f"{name}{{{_labels(cache=cache_name)}}} {instance.stats()[field]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def _render_histogram(name, help_text, buckets, histograms):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (method, route), hist in sorted(histograms.items()):
+        labels = _labels(method=method, route=route)
+        cumulative = 0
+        for bound, count in zip(buckets, hist.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+        lines.append(f"{name}_sum{{{labels}}} {hist.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {hist.count}")
+    return lines
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request through to the last body chunk,
+    so streamed responses are measured in full. Routes are labelled by their
+    template (e.g. /income/{income_id}) to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(record_statements=SLOW_REQUEST_MS > 0)
+        token = _current_request.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_request.reset(token)
+            metrics.observe(scope["method"], _route_label(scope), status, elapsed, stats)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow(scope, status, elapsed, stats)
+
+
+def _route_label(scope) -> str:
+    # Newer FastAPI keeps included routes un-prefixed and records the full template separately
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
+
+
+def _log_slow(scope, status, elapsed, stats):
+    statements = "".join(f"\n  {seconds * 1000:8.2f} ms  {sql.strip()}" for seconds, sql in stats.statements)
+    if stats.queries > len(stats.statements):
+        statements += f"\n  ... {stats.queries - len(stats.statements)} more"
+    slow_log.warning(
+        "%s %s -> %s in %.1f ms (%d queries, %d failed, %.1f ms in SQL)%s",
+        scope["method"], scope["path"], status, elapsed * 1000, stats.queries, stats.db_errors, stats.db_time * 1000, statements,
+    )
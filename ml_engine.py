@@ -1,60 +1,211 @@
 
-import pandas as pd
-try:
-    from sklearn.linear_model import LinearRegression
-except ImportError:
-    LinearRegression = None
+import os
+import numpy as np
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
-from models import Expense
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import DailyRollup, DataVersion
+from cache import TTLCache
+from versioning import get_version, EXPENSES
+from rollups import EXPENSE, FORECAST_HISTORY_DAYS, history_start
+from executor import run_ml
 import datetime
+from itertools import groupby
+from operator import itemgetter
+
+# Fitted models keyed by (user_id, expense data version, fit date)
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "1024"))
+forecast_cache = TTLCache(maxsize=FORECAST_CACHE_SIZE, name="forecast")
+
+# With less history than this, weekday effects can't be told from noise: trend only
+MIN_SEASONAL_DAYS = int(os.getenv("FORECAST_MIN_SEASONAL_DAYS", "14"))
+# Two-sided ~95% prediction interval
+INTERVAL_Z = 1.96
+
+def _to_day_numbers(dates):
+    # Dates -> int64 days since the epoch, without per-row Python conversions
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+def _design(day_numbers, centre, seasonal):
+    """Rows of [1, days from centre, Tue..Sun indicators]; Monday is the baseline day."""
+    t = (day_numbers - centre).astype(np.float64)
+    columns = [np.ones_like(t), t]
+    if seasonal:
+        weekday = (day_numbers + 3) % 7  # 1970-01-01 was a Thursday; 0 = Monday
+        columns += [(weekday == k).astype(np.float64) for k in range(1, 7)]
+    return np.column_stack(columns)
+
+class FittedForecast:
+    """Coefficients for every category of one user, plus what projecting and intervals need."""
+    __slots__ = ("categories", "coefficients", "covariance", "sigma", "total_sigma", "centre", "seasonal")
+
+    def __init__(self, categories, coefficients, covariance, sigma, total_sigma, centre, seasonal):
+        self.categories = categories
+        self.coefficients = coefficients
+        self.covariance = covariance
+        self.sigma = sigma
+        self.total_sigma = total_sigma
+        self.centre = centre
+        self.seasonal = seasonal
+
+def fit_categories(day_numbers, category_index, amounts, categories, end_day):
+    """
+    Fits all of a user's categories in one least-squares solve.
+    Daily spend is laid out as Y (days x categories), zero-filled on days with
+    no spending, and every column shares the same design matrix, so one
+    lstsq call fits them all; adding categories adds columns, not solves.
+    """
+    first = max(int(day_numbers.min()), end_day - FORECAST_HISTORY_DAYS + 1)
+    n = end_day - first + 1
+    keep = (day_numbers >= first) & (day_numbers <= end_day)
+    y = np.zeros((n, len(categories)))
+    np.add.at(y, (day_numbers[keep] - first, category_index[keep]), amounts[keep])
+
+    seasonal = n >= MIN_SEASONAL_DAYS
+    centre = (first + end_day) / 2
+    x = _design(np.arange(first, end_day + 1), centre, seasonal)
+    coefficients = np.linalg.lstsq(x, y, rcond=None)[0]
+
+    # The model is linear and the design shared, so the total's fit is the sum of the categories' fits
+    residuals = y - x @ coefficients
+    dof = max(n - x.shape[1], 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=0) / dof)
+    total_sigma = float(np.sqrt((residuals.sum(axis=1) ** 2).sum() / dof))
+    covariance = np.linalg.pinv(x.T @ x)
+    return FittedForecast(categories, coefficients, covariance, sigma, total_sigma, centre, seasonal)
+
+def empty_forecast():
+    return {"forecast": [], "by_category": {}, "model": None}
+
+def project(model, days, start=None):
+    """
+    Turns a fitted model into the API response: daily total predictions under
+    "forecast" and per-category series under "by_category", each point with a
+    prediction interval. Predictions start the day after `start` (today).
+    """
+    if model is None:
+        return empty_forecast()
+    start = start or datetime.date.today()
+    first = _to_day_numbers([start])[0] + 1
+    future = np.arange(first, first + days, dtype=np.int64)
+    x = _design(future, model.centre, model.seasonal)
+    predicted = x @ model.coefficients
+    # Interval widens away from the fitted window: sigma * sqrt(1 + x (X'X)^-1 x')
+    spread = INTERVAL_Z * np.sqrt(1 + np.einsum("ij,jk,ik->i", x, model.covariance, x))
+    dates = future.astype("datetime64[D]").astype(str).tolist()
+
+    def series(values, sigma):
+        margin = spread * sigma
+        return [
+            {"date": d, "predicted_amount": p, "lower": lo, "upper": hi}
+            for d, p, lo, hi in zip(
+                dates,
+                np.maximum(np.round(values, 2), 0).tolist(),
+                np.maximum(np.round(values - margin, 2), 0).tolist(),
+                np.maximum(np.round(values + margin, 2), 0).tolist(),
+            )
+        ]
+
+    return {
+        "forecast": series(predicted.sum(axis=1), model.total_sigma),
+        "by_category": {
+            category: series(predicted[:, i], model.sigma[i]) for i, category in enumerate(model.categories)
+        },
+        "model": "weekday" if model.seasonal else "trend",
+    }
+
+def _series_arrays(dates, categories, amounts):
+    # Query rows -> (day numbers, dense category index, amounts, category names)
+    names, index = np.unique(np.asarray(categories, dtype=object).astype(str), return_inverse=True)
+    return _to_day_numbers(dates), index, np.asarray(amounts, dtype=np.float64), names.tolist()
+
+def _end_day(day_numbers, today):
+    # Fit through at least yesterday so recent quiet days count as zero spend; today may still be in progress
+    return max(int(_to_day_numbers([today])[0]) - 1, int(day_numbers.max()))
 
 class ExpenseForecaster:
     def __init__(self, db: Session, user_id: int):
         self.db = db
         self.user_id = user_id
-        self.model = LinearRegression()
-
-    def get_data(self):
-        # Fetch expenses for the user
-        expenses = self.db.query(Expense).filter(Expense.user_id == self.user_id).all()
-        if not expenses:
-            return pd.DataFrame()
-        
-        data = [{"date": e.date, "amount": e.amount} for e in expenses]
-        df = pd.DataFrame(data)
-        df['date'] = pd.to_datetime(df['date'])
-        return df
-
-    def train_model(self):
-        df = self.get_data()
-        if df.empty:
-            return None, "Not enough data"
-
-        # Aggregate by day
-        daily_expenses = df.groupby('date')['amount'].sum().reset_index()
-        
-        # Prepare features (convert date to ordinal)
-        daily_expenses['date_ordinal'] = daily_expenses['date'].apply(lambda x: x.toordinal())
-        
-        X = daily_expenses[['date_ordinal']]
-        y = daily_expenses['amount']
-        
-        self.model.fit(X, y)
-        return True, "Model trained"
-
-    def predict_next_days(self, days=30):
-        is_trained, msg = self.train_model()
-        if not is_trained:
-            return []
-
-        last_date = datetime.date.today()
-        future_dates = [last_date + datetime.timedelta(days=i) for i in range(1, days + 1)]
-        future_ordinals = [[d.toordinal()] for d in future_dates]
-        
-        predictions = self.model.predict(future_ordinals)
-        
-        result = []
-        for d, p in zip(future_dates, predictions):
-            result.append({"date": d.strftime("%Y-%m-%d"), "predicted_amount": max(0, round(p, 2))})
-            
-        return result
+
+    def get_data(self, today=None):
+        """Daily spend per category inside the history window, from the rollup table; None without data."""
+        today = today or datetime.date.today()
+        rows = self.db.execute(
+            select(DailyRollup.date, DailyRollup.category, func.sum(DailyRollup.total))
+            .where(
+                DailyRollup.user_id == self.user_id,
+                DailyRollup.kind == EXPENSE,
+                DailyRollup.date >= history_start(today),
+            )
+            .group_by(DailyRollup.date, DailyRollup.category)
+        ).all()
+        if not rows:
+            return None
+        return _series_arrays(*zip(*rows))
+
+async def forecast_async(db: AsyncSession, user_id: int, days=30):
+    """
+    Async request path: queries run on the event loop through the async session,
+    the fit runs on the ML executor. Shares forecast_cache with preload_forecasts.
+    """
+    today = datetime.date.today()
+    key = (user_id, await db.run_sync(get_version, user_id, EXPENSES), today)
+    cached = forecast_cache.get(key)
+    if cached is None:
+        data = await db.run_sync(lambda session: ExpenseForecaster(session, user_id).get_data(today))
+        model = await run_ml(fit_categories, *data, _end_day(data[0], today)) if data is not None else None
+        cached = (model,)
+        forecast_cache.set(key, cached)
+    return project(cached[0], days, start=today)
+
+def _fit_many(db: Session, user_ids, today):
+    """One GROUP BY query for many users, then one stacked solve per user -> {user_id: FittedForecast}."""
+    rows = db.execute(
+        select(DailyRollup.user_id, DailyRollup.date, DailyRollup.category, func.sum(DailyRollup.total))
+        .where(
+            DailyRollup.user_id.in_(user_ids),
+            DailyRollup.kind == EXPENSE,
+            DailyRollup.date >= history_start(today),
+        )
+        .group_by(DailyRollup.user_id, DailyRollup.date, DailyRollup.category)
+        .order_by(DailyRollup.user_id)
+    ).all()
+    models = {}
+    for user_id, user_rows in groupby(rows, key=itemgetter(0)):
+        data = _series_arrays(*zip(*(row[1:] for row in user_rows)))
+        models[user_id] = fit_categories(*data, _end_day(data[0], today))
+    return models
+
+def forecast_many(db: Session, user_ids, days=30):
+    """
+    Batch forecast for precompute jobs: one GROUP BY query for every user,
+    no per-user queries. Returns {user_id: forecast response}.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    today = datetime.date.today()
+    models = _fit_many(db, user_ids, today)
+    return {user_id: project(models.get(user_id), days, start=today) for user_id in user_ids}
+
+def preload_forecasts(db: Session, limit: int):
+    """
+    Fills forecast_cache for the `limit` users with the most recent expenses,
+    so their first forecast after a restart skips the fit. Returns the count.
+    """
+    user_ids = list(db.scalars(
+        select(DailyRollup.user_id).where(DailyRollup.kind == EXPENSE)
+        .group_by(DailyRollup.user_id).order_by(func.max(DailyRollup.date).desc()).limit(limit)
+    ))
+    if not user_ids:
+        return 0
+    versions = dict(db.execute(
+        select(DataVersion.user_id, DataVersion.version)
+        .where(DataVersion.user_id.in_(user_ids), DataVersion.scope == EXPENSES)
+    ).all())
+    today = datetime.date.today()
+    models = _fit_many(db, user_ids, today)
+    for user_id in user_ids:
+        forecast_cache.set((user_id, versions.get(user_id, 0), today), (models.get(user_id),))
+    return len(user_ids)
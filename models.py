@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Boolean
+from sqlalchemy import func, Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -33,6 +33,11 @@ class Income(Base):
     date = Column(Date)
     user = relationship("User", back_populates="incomes")
     wallet = relationship("Wallet", back_populates="incomes")
+    __table_args__ = (
+        Index("ix_incomes_user_date", "user_id", "date"),
+        Index("ix_incomes_user_source", "user_id", "source"),
+        Index("ix_incomes_user_date_amount_source", "user_id", "date", "amount", "source"),  # import dedupe
+    )
 
 class Expense(Base):
     __tablename__ = "expenses"
@@ -44,3 +49,74 @@ class Expense(Base):
     date = Column(Date)
     user = relationship("User", back_populates="expenses")
     wallet = relationship("Wallet", back_populates="expenses")
+    __table_args__ = (
+        Index("ix_expenses_user_date", "user_id", "date"),
+        Index("ix_expenses_user_category", "user_id", "category"),
+        Index("ix_expenses_user_date_amount_category", "user_id", "date", "amount", "category"),  # import dedupe
+    )
+
+class DataVersion(Base):
+    """Per-user counters bumped on writes; cached results are keyed by them."""
+    __tablename__ = "data_versions"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    scope = Column(String, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+
+class DailyRollup(Base):
+    """Per-day sums of incomes (by source) and expenses (by category); reports read these."""
+    __tablename__ = "daily_rollups"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    kind = Column(String, primary_key=True)  # "income" or "expense"
+    category = Column(String, primary_key=True)  # income source or expense category
+    total = Column(Float, default=0, nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+
+class Forecast(Base):
+    """Latest precomputed /report/forecast body per user, written by the background scheduler."""
+    __tablename__ = "forecasts"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    data_version = Column(Integer, nullable=False)  # expense data version the fit used
+    fit_date = Column(Date, nullable=False)  # predictions start the day after
+    computed_at = Column(DateTime, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON response body
+
+class ExpenseStat(Base):
+    """Running count/mean/M2 (Welford) of expense amounts per category; weekday -1 covers every day."""
+    __tablename__ = "expense_stats"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category = Column(String, primary_key=True)
+    weekday = Column(Integer, primary_key=True)  # 0 = Monday .. 6 = Sunday, -1 = all days
+    count = Column(Integer, default=0, nullable=False)
+    mean = Column(Float, default=0, nullable=False)
+    m2 = Column(Float, default=0, nullable=False)
+
+class ExpenseAnomaly(Base):
+    """Expenses flagged as unusual when they were written."""
+    __tablename__ = "expense_anomalies"
+    expense_id = Column(Integer, ForeignKey("expenses.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(Date)
+    category = Column(String)
+    amount = Column(Float)
+    expected = Column(Float)  # mean amount the expense was compared against
+    score = Column(Float)  # standard deviations above that mean
+    __table_args__ = (
+        Index("ix_expense_anomalies_user_date", "user_id", "date"),
+    )
+
+class Budget(Base):
+    """Monthly spending limit, overall or for one category, with its spend kept current by expense writes."""
+    __tablename__ = "budgets"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    month = Column(String(7), nullable=False)  # "YYYY-MM"
+    category = Column(String, nullable=True)  # None = all categories
+    limit = Column(Float, nullable=False)
+    spent = Column(Float, default=0, nullable=False)
+    __table_args__ = (
+        Index("ix_budgets_user_month", "user_id", "month"),
+    )
+
+# One budget per (user, month, category); NULL (all categories) is folded to "" so it is unique too
+Index("ux_budgets_user_month_category", Budget.user_id, Budget.month, func.coalesce(Budget.category, ""), unique=True)
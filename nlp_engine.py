@@ -1,49 +1,76 @@
 
 import re
-from fastapi import APIRouter
+from typing import List
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
 router = APIRouter()
 
+MAX_BATCH_LINES = 10000
+
 class NLPRequest(BaseModel):
     text: str
 
+class NLPBatchRequest(BaseModel):
+    texts: List[str]
+
 class TransactionParser:
     def __init__(self):
-        # Regex patterns for extraction
-        self.amount_pattern = r"(\d+(\.\d{1,2})?)"
-        
         # Keywords to identify type
         self.income_keywords = ["received", "got", "income", "salary", "deposit", "added"]
         self.expense_keywords = ["spent", "paid", "bought", "expense", "purchase", "cost"]
-        
+        self.prepositions = ["on", "for", "from", "at", "in", "to"]
+
+        # Single-pass tokenizer: numbers and whole words only, so keywords are matched
+        # against complete words and "got" no longer fires inside "forgot"
+        self._token_re = re.compile(r"\d+(?:\.\d{1,2})?|[^\W\d_]+(?:'[^\W\d_]+)?")
+        # Keyword stems with the inflections bank SMS use ("deposited", "purchased",
+        # "costs"), one precompiled pattern per type, combined so each word costs one match.
+        # Bare "credit"/"debit" stay out: they also name cards ("credit card bill").
+        income = r"receiv(?:e|es|ed|ing)|got|incomes?|salar(?:y|ies)|deposit(?:s|ed)?|added|credited"
+        expense = r"spen(?:d|ds|ding|t)|paid|pa(?:y|ys|ying)|bought|expenses?|purchas(?:e|es|ed|ing)|cost(?:s|ing)?|debited"
+        self._keyword_re = re.compile(rf"(?P<income>{income})|(?P<expense>{expense})")
+        self._stop_set = frozenset(self.prepositions)
+
     def parse(self, text: str):
         """
         Parses a natural language string to extract transaction details.
         Returns a dict: {"type": str, "amount": float, "category": str}
         """
-        text = text.lower().strip()
+        amount = None
+        is_income = is_expense = False
+        words = []
+        keyword_match = self._keyword_re.fullmatch
+        for token in self._token_re.findall(text.lower()):
+            if token[0].isdigit():
+                # First number is the amount; other numbers never belong to the category
+                if amount is None:
+                    amount = float(token)
+            elif token not in self._stop_set:
+                keyword = keyword_match(token)
+                if keyword is None:
+                    words.append(token)
+                elif keyword.lastgroup == "income":
+                    is_income = True
+                else:
+                    is_expense = True
+
+        # 1. Amount
+        if amount is None:
+            return None # No amount found, cannot process
+
         result = {
             "type": None,
-            "amount": 0.0,
+            "amount": amount,
             "category": "General", # Default
             "confidence": 0.0
         }
 
-        # 1. Extract Amount
-        match = re.search(self.amount_pattern, text)
-        if match:
-            result["amount"] = float(match.group(1))
-        else:
-            return None # No amount found, cannot process
-
-        # 2. Determine Type (Income vs Expense)
-        # Check for income keywords
-        if any(word in text for word in self.income_keywords):
+        # 2. Determine Type (Income vs Expense); income keywords take precedence
+        if is_income:
             result["type"] = "Income"
             result["confidence"] = 0.8
-        # Check for expense keywords
-        elif any(word in text for word in self.expense_keywords):
+        elif is_expense:
             result["type"] = "Expense"
             result["confidence"] = 0.8
         else:
@@ -51,23 +78,9 @@ class TransactionParser:
             result["type"] = "Expense"
             result["confidence"] = 0.5
 
-        # 3. Extract Category/Source
-        # Strategy: Remove amount and keywords, what's left is likely the category
-        clean_text = text
-        # Remove amount
-        clean_text = re.sub(self.amount_pattern, "", clean_text)
-        
-        # Remove common prepositions
-        for prep in [" on ", " for ", " from ", " at ", " in ", " to "]:
-            clean_text = clean_text.replace(prep, " ")
-            
-        # Remove keywords
-        for word in self.income_keywords + self.expense_keywords:
-            clean_text = clean_text.replace(word, "")
-            
-        # Clean up whitespace
-        category = clean_text.strip().title()
-        
+        # 3. Category/Source: whatever is left once amount, keywords and prepositions are gone
+        category = " ".join(words).title()
+
         # If category is empty or just "dollars", set default
         if not category or category in ["Dollars", "Rupees", "Rs"]:
             result["category"] = "Uncategorized"
@@ -76,8 +89,19 @@ class TransactionParser:
 
         return result
 
+    def parse_many(self, texts):
+        """Parses a batch of lines; unparseable lines yield None at the same position."""
+        parse = self.parse
+        return [parse(text) for text in texts]
+
 parser = TransactionParser()
 
 @router.post("/parse")
 def parse_text(request: NLPRequest):
     return parser.parse(request.text)
+
+@router.post("/parse_batch")
+def parse_text_batch(request: NLPBatchRequest):
+    if len(request.texts) > MAX_BATCH_LINES:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_LINES} lines)")
+    return {"results": parser.parse_many(request.texts)}
@@ -0,0 +1,40 @@
+import base64
+from datetime import date
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Keyset cursors over (date, id), newest first.
+# The cursor is the (date, id) of the last row of the previous page.
+
+def encode_cursor(row_date: date, row_id: int) -> str:
+    raw = f"{row_date.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        row_date, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return date.fromisoformat(row_date), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate(query, date_column, id_column, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE):
+    """
+    Applies keyset pagination ordered by (date, id) descending.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            date_column < cursor_date,
+            and_(date_column == cursor_date, id_column < cursor_id),
+        ))
+    rows = query.order_by(date_column.desc(), id_column.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    return rows, next_cursor
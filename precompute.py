@@ -0,0 +1,202 @@
+
+"""
+Background forecast precompute.
+
+A scheduler looks for users with recent expenses whose data version moved
+past their stored forecast (or whose forecast was fitted on an earlier day),
+refits them in a process pool and stores the response bodies in the
+forecasts table, where /report/forecast serves them from.
+
+Both halves are opt-in. FORECAST_PRECOMPUTE=1 on the API processes makes them
+serve stored forecasts. The scheduler runs in exactly one process per
+deployment, since every running scheduler refits the same users with its own
+pool: either one API process with FORECAST_SCHEDULER=1, or a separate
+
+    python precompute.py
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from sqlalchemy import and_, delete, exists, func, insert, or_, select
+from database import SessionLocal
+from models import DailyRollup, DataVersion, Forecast, User
+from rollups import EXPENSE, history_start
+from versioning import bump_version, EXPENSES, FORECASTS
+
+# Serve /report/forecast from the forecasts table; off = fit per request
+PRECOMPUTE_ENABLED = os.getenv("FORECAST_PRECOMPUTE", "0") == "1"
+# Run the scheduler from this process's lifespan; set it on one process only
+FORECAST_SCHEDULER = os.getenv("FORECAST_SCHEDULER", "0") == "1"
+# Seconds between scans for outdated forecasts
+FORECAST_PRECOMPUTE_INTERVAL_SECONDS = float(os.getenv("FORECAST_PRECOMPUTE_INTERVAL_SECONDS", "60"))
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 1)))
+# Users refitted per scan; a full batch triggers the next scan right away
+FORECAST_PRECOMPUTE_BATCH = int(os.getenv("FORECAST_PRECOMPUTE_BATCH", "500"))
+# Horizon stored per user; longer requests are fitted inline
+FORECAST_STORE_DAYS = int(os.getenv("FORECAST_STORE_DAYS", "90"))
+
+log = logging.getLogger("wisemoney.precompute")
+
+def find_outdated(db, today: date, limit: int):
+    """
+    (user_id, expense version) for active users with expenses in the history
+    window and no forecast for their current data and today. Users without
+    recent expenses are skipped; their (empty) forecast is cheap to fit inline.
+    """
+    version = func.coalesce(DataVersion.version, 0)
+    recent_expenses = exists().where(
+        DailyRollup.user_id == User.id, DailyRollup.kind == EXPENSE, DailyRollup.date >= history_start(today),
+    )
+    return db.execute(
+        select(User.id, version)
+        .outerjoin(DataVersion, and_(DataVersion.user_id == User.id, DataVersion.scope == EXPENSES))
+        .outerjoin(Forecast, Forecast.user_id == User.id)
+        .where(
+            User.is_active.is_not(False),
+            recent_expenses,
+            or_(Forecast.user_id.is_(None), Forecast.data_version < version, Forecast.fit_date < today),
+        )
+        .order_by(User.id)
+        .limit(limit)
+    ).all()
+
+def compute_forecasts(user_ids, days: int):
+    """Runs in a worker process with its own engine: one query, one stacked fit per user."""
+    from ml_engine import forecast_many
+    with SessionLocal() as db:
+        return forecast_many(db, user_ids, days)
+
+def store_forecasts(db, versions: dict, results: dict, today: date):
+    """Replaces the users' stored forecasts and bumps their FORECASTS version so report ETags change."""
+    computed_at = datetime.utcnow()
+    user_ids = list(results)
+    db.execute(delete(Forecast).where(Forecast.user_id.in_(user_ids)))
+    db.execute(insert(Forecast), [
+        {
+            "user_id": user_id, "data_version": versions[user_id], "fit_date": today,
+            "computed_at": computed_at, "payload": json.dumps(results[user_id]),
+        }
+        for user_id in user_ids
+    ])
+    for user_id in user_ids:
+        bump_version(db, user_id, FORECASTS)
+    db.commit()
+
+def stored_forecast(row: Forecast, current_version: int, today: date, days: int):
+    """
+    Slices a stored forecast to the next `days` days; None if it doesn't reach
+    that far. The version recorded with it decides whether it is stale.
+    """
+    payload = json.loads(row.payload)
+    tomorrow = date.fromordinal(today.toordinal() + 1).isoformat()
+
+    def window(points):
+        points = [point for point in points if point["date"] >= tomorrow]
+        return points[:days] if len(points) >= days else None
+
+    if payload["forecast"]:
+        payload["forecast"] = window(payload["forecast"])
+        if payload["forecast"] is None:
+            return None
+    payload["by_category"] = {category: window(points) or [] for category, points in payload["by_category"].items()}
+    payload["computed_at"] = row.computed_at.isoformat() + "Z"
+    payload["stale"] = row.data_version < current_version
+    return payload
+
+class ForecastScheduler:
+    def __init__(self, interval: float, workers: int, batch: int):
+        self.interval = interval
+        self.workers = max(1, workers)
+        self.batch = batch
+        self._executor = None
+        self._task = None
+
+    def _pool(self):
+        # spawn, not fork: the parent has live threads and pooled DB connections
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    @staticmethod
+    def _find(today, limit):
+        with SessionLocal() as db:
+            return find_outdated(db, today, limit)
+
+    @staticmethod
+    def _store(versions, results, today):
+        with SessionLocal() as db:
+            store_forecasts(db, versions, results, today)
+
+    async def run_once(self) -> int:
+        """One scan: refits up to `batch` outdated users across the pool. Returns how many were stored."""
+        today = date.today()
+        versions = dict(await asyncio.to_thread(self._find, today, self.batch))
+        if not versions:
+            return 0
+        user_ids = list(versions)
+        chunks = [user_ids[i::self.workers] for i in range(min(self.workers, len(user_ids)))]
+        loop = asyncio.get_running_loop()
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(self._pool(), compute_forecasts, chunk, FORECAST_STORE_DAYS) for chunk in chunks
+        ))
+        results = {user_id: body for part in parts for user_id, body in part.items()}
+        await asyncio.to_thread(self._store, versions, results, today)
+        return len(results)
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.run_once() >= self.batch:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Forecast precompute failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+scheduler = ForecastScheduler(FORECAST_PRECOMPUTE_INTERVAL_SECONDS, FORECAST_WORKERS, FORECAST_PRECOMPUTE_BATCH)
+
+async def _run_standalone():
+    scheduler.start()
+    # Stop cleanly on SIGINT/SIGTERM so the worker pool is shut down
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, scheduler._task.cancel)
+    try:
+        await scheduler._task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await scheduler.stop()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    from database import init_db
+    init_db()
+    log.info("Forecast scheduler running every %ss with %s workers", scheduler.interval, scheduler.workers)
+    asyncio.run(_run_standalone())
+
+if __name__ == "__main__":
+    main()
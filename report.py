@@ -1,88 +1,338 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, literal, null, union_all, case, String, cast
+from typing import Optional
+from datetime import date, datetime
 from database import SessionLocal
-from models import Income, Expense, Wallet, User
-from auth import get_db, SECRET_KEY, ALGORITHM
+from models import Income, Expense, Wallet, User, DailyRollup, Forecast, ExpenseAnomaly
+from auth import get_async_db, SECRET_KEY, ALGORITHM
 from jose import jwt, JWTError
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from cache import TTLCache
+from versioning import get_version, get_versions, INCOMES, EXPENSES, WALLETS, FORECASTS
+from precompute import PRECOMPUTE_ENABLED, stored_forecast
+from rollups import INCOME, EXPENSE
+import csv
+import hashlib
+import io
+import json
+import os
 
 router = APIRouter()
+
+# Rendered report bodies keyed by (user, endpoint, params, data versions)
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "2048"))
+REPORT_CACHE_TTL_SECONDS = float(os.getenv("REPORT_CACHE_TTL_SECONDS", "3600"))
+report_cache = TTLCache(maxsize=REPORT_CACHE_SIZE, ttl=REPORT_CACHE_TTL_SECONDS, name="report")
 # Get current user
 from auth import get_current_user
 
-# Total income, total expense, total balance across wallets
-@router.get("/summary")
-def get_summary(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    total_income = db.query(Income).filter(Income.user_id == current_user.id).with_entities(Income.amount).all()
-    total_income = sum([i[0] for i in total_income])
+def _date_bounds(column, date_from: Optional[date], date_to: Optional[date]):
+    conditions = []
+    if date_from:
+        conditions.append(column >= date_from)
+    if date_to:
+        conditions.append(column <= date_to)
+    return conditions
+
+def _opaque_tag(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+def _if_none_match(request: Request, etag: str) -> bool:
+    # Weak comparison (RFC 7232 section 3.2): "x" and W/"x" match each other
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {_opaque_tag(tag.strip()) for tag in header.split(",")}
+    return "*" in tags or _opaque_tag(etag) in tags
+
+async def _conditional_report(request: Request, db: AsyncSession, user_id: int, endpoint: str, params: dict, scopes, compute):
+    """
+    Serves a report with an ETag derived from the user's data versions.
+    Matching If-None-Match -> 304 with no work; otherwise the body comes from
+    report_cache keyed by (user, endpoint, params, versions), computed on a miss.
+    """
+    versions = await db.run_sync(get_versions, user_id)
+    key = (user_id, endpoint, tuple(sorted(params.items())), tuple(versions.get(scope, 0) for scope in scopes))
+    etag = 'W/"%s"' % hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _if_none_match(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = report_cache.get(key)
+    if body is None:
+        body = await compute()
+        report_cache.set(key, body)
+    return JSONResponse(body, headers=headers)
 
-    total_expense = db.query(Expense).filter(Expense.user_id == current_user.id).with_entities(Expense.amount).all()
-    total_expense = sum([e[0] for e in total_expense])
+async def _compute_summary(db: AsyncSession, user_id: int, date_from: Optional[date], date_to: Optional[date]):
+    # One UNION ALL statement over daily rollups: an income row, a wallet row and one row per expense category
+    in_range = (DailyRollup.user_id == user_id, *_date_bounds(DailyRollup.date, date_from, date_to))
+    income_q = select(
+        literal("income").label("kind"),
+        cast(null(), String).label("category"),
+        func.coalesce(func.sum(DailyRollup.total), 0).label("total"),
+        func.coalesce(func.sum(DailyRollup.count), 0).label("count"),
+    ).where(*in_range, DailyRollup.kind == INCOME)
 
-    total_wallet_balance = db.query(Wallet).filter(Wallet.user_id == current_user.id).with_entities(Wallet.balance).all()
-    total_wallet_balance = sum([w[0] for w in total_wallet_balance])
+    wallet_q = select(
+        literal("wallet"),
+        cast(null(), String),
+        func.coalesce(func.sum(Wallet.balance), 0),
+        func.count(Wallet.id),
+    ).where(Wallet.user_id == user_id)
 
-    expense_by_category = db.query(Expense.category, func.sum(Expense.amount)).filter(Expense.user_id == current_user.id).group_by(Expense.category).all()
-    category_data = [{"category": c, "amount": a} for c, a in expense_by_category]
+    expense_q = select(
+        literal("expense"),
+        DailyRollup.category,
+        func.sum(DailyRollup.total),
+        func.sum(DailyRollup.count),
+    ).where(*in_range, DailyRollup.kind == EXPENSE).group_by(DailyRollup.category)
+
+    total_income = total_wallet_balance = total_expense = 0
+    income_count = expense_count = 0
+    category_data = []
+    for kind, category, total, count in await db.execute(union_all(income_q, wallet_q, expense_q)):
+        if kind == "income":
+            total_income, income_count = total, count
+        elif kind == "wallet":
+            total_wallet_balance = total
+        else:
+            total_expense += total
+            expense_count += count
+            category_data.append({"category": category, "amount": total})
 
     return {
         "total_income": total_income,
         "total_expense": total_expense,
         "total_wallet_balance": total_wallet_balance,
         "net_balance": total_wallet_balance, # Simple balance
+        "income_count": income_count,
+        "expense_count": expense_count,
         "expense_by_category": category_data
     }
 
-from ml_engine import ExpenseForecaster
+# Total income, total expense, total balance across wallets
+@router.get("/summary")
+async def get_summary(
+    request: Request,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    return await _conditional_report(
+        request, db, current_user.id, "summary",
+        {"from": date_from, "to": date_to}, (INCOMES, EXPENSES, WALLETS),
+        lambda: _compute_summary(db, current_user.id, date_from, date_to),
+    )
 
 @router.get("/forecast")
-def get_forecast(days: int = 30, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    forecaster = ExpenseForecaster(db, current_user.id)
-    predictions = forecaster.predict_next_days(days)
-    return {"forecast": predictions}
+async def get_forecast(
+    request: Request,
+    days: int = Query(30, ge=1, le=365),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Daily spend forecast: totals under "forecast" and per-category series under
+    "by_category", each point with a ~95% prediction interval (lower/upper),
+    plus when it was computed and whether newer expenses have arrived since.
+    """
+    today = date.today()
+
+    async def compute():
+        # Precomputed by the background scheduler when enabled; "stale" means newer expenses are pending
+        if PRECOMPUTE_ENABLED:
+            row = await db.get(Forecast, current_user.id)
+            if row is not None:
+                version = await db.run_sync(get_version, current_user.id, EXPENSES)
+                body = stored_forecast(row, version, today, days)
+                if body is not None:
+                    return body
+        # Imported on first use so numpy stays off the startup path
+        from ml_engine import forecast_async
+        body = await forecast_async(db, current_user.id, days)
+        return {**body, "computed_at": datetime.utcnow().isoformat() + "Z", "stale": False}
+    # Predictions start tomorrow, so the date is part of the cache key; FORECASTS moves when a new result is stored
+    return await _conditional_report(
+        request, db, current_user.id, "forecast",
+        {"days": days, "today": today}, (EXPENSES, FORECASTS), compute,
+    )
+
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_COLUMNS = ["date", "type", "category", "amount"]
+
+def _export_rows(user_id: int):
+    # Incomes and expenses merged and ordered by the database, fetched in chunks
+    incomes = select(
+        Income.date.label("date"), literal("Income").label("type"), Income.source.label("category"), Income.amount.label("amount")
+    ).where(Income.user_id == user_id)
+    expenses = select(
+        Expense.date, literal("Expense"), Expense.category, Expense.amount
+    ).where(Expense.user_id == user_id)
+    merged = union_all(incomes, expenses).subquery()
+    stmt = select(merged).order_by(merged.c.date.desc())
+
+    # Own session: the request-scoped one may be closed before streaming finishes
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt, execution_options={"yield_per": EXPORT_CHUNK_ROWS})
+        for chunk in result.partitions():
+            yield chunk
+    finally:
+        db.close()
+
+def _export_csv(user_id: int):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in _export_rows(user_id):
+        for d, type_, category, amount in chunk:
+            writer.writerow([d.isoformat() if d else "", type_, category, amount])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _export_ndjson(user_id: int):
+    for chunk in _export_rows(user_id):
+        yield "".join(
+            json.dumps({"date": d.isoformat() if d else None, "type": type_, "category": category, "amount": amount}) + "\n"
+            for d, type_, category, amount in chunk
+        )
 
 @router.get("/export")
-def export_data(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    incomes = db.query(Income).filter(Income.user_id == current_user.id).all()
-    expenses = db.query(Expense).filter(Expense.user_id == current_user.id).all()
-    
-    data = []
-    for i in incomes:
-        data.append({
-            "date": i.date,
-            "type": "Income",
-            "category": i.source,
-            "amount": i.amount
-        })
-    for e in expenses:
-        data.append({
-            "date": e.date,
-            "type": "Expense",
-            "category": e.category,
-            "amount": e.amount
-        })
-    # Sort by date descending
-    return sorted(data, key=lambda x: x['date'], reverse=True)
+def export_data(format: str = Query("csv", pattern="^(csv|ndjson)$"), current_user: User = Depends(get_current_user)):
+    if format == "ndjson":
+        return StreamingResponse(_export_ndjson(current_user.id), media_type="application/x-ndjson")
+    return StreamingResponse(
+        _export_csv(current_user.id),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="wisemoney_data.csv"'},
+    )
+
+def _period_expr(db, column, granularity: str):
+    # Bucket a date column into a sortable label; weeks are labelled by their Monday
+    if db.get_bind().dialect.name == "sqlite":
+        if granularity == "day":
+            return func.strftime("%Y-%m-%d", column)
+        if granularity == "week":
+            return func.date(column, "weekday 0", "-6 days")
+        return func.strftime("%Y-%m", column)
+    if granularity == "day":
+        return func.to_char(column, "YYYY-MM-DD")
+    if granularity == "week":
+        return func.to_char(func.date_trunc("week", column), "YYYY-MM-DD")
+    return func.to_char(column, "YYYY-MM")
+
+async def _compute_trend(db: AsyncSession, user_id: int, granularity: str, date_from: Optional[date], date_to: Optional[date]):
+    # Buckets daily rollups, so the cost follows the number of days rather than transactions
+    period = _period_expr(db, DailyRollup.date, granularity)
+    rows = await db.execute(
+        select(
+            period,
+            func.sum(case((DailyRollup.kind == INCOME, DailyRollup.total), else_=0.0)),
+            func.sum(case((DailyRollup.kind == EXPENSE, DailyRollup.total), else_=0.0)),
+        )
+        .where(DailyRollup.user_id == user_id, *_date_bounds(DailyRollup.date, date_from, date_to))
+        .group_by(period)
+        .order_by(period)
+    )
+    return [{"period": period, "income": income, "expense": expense} for period, income, expense in rows]
 
 @router.get("/trend")
-def get_trend(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    # Aggregate in Python for simplicity
-    incomes = db.query(Income).filter(Income.user_id == current_user.id).all()
-    expenses = db.query(Expense).filter(Expense.user_id == current_user.id).all()
-    
-    monthly_data = {}
-    
-    for i in incomes:
-        month = i.date.strftime("%Y-%m")
-        if month not in monthly_data: monthly_data[month] = {"income": 0, "expense": 0}
-        monthly_data[month]["income"] += i.amount
-
-    for e in expenses:
-        month = e.date.strftime("%Y-%m")
-        if month not in monthly_data: monthly_data[month] = {"income": 0, "expense": 0}
-        monthly_data[month]["expense"] += e.amount
-        
-    result = [{"month": k, "income": v["income"], "expense": v["expense"]} for k,v in monthly_data.items()]
-    return sorted(result, key=lambda x: x['month'])
+async def get_trend(
+    request: Request,
+    granularity: str = Query("month", pattern="^(day|week|month)$"),
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    return await _conditional_report(
+        request, db, current_user.id, "trend",
+        {"granularity": granularity, "from": date_from, "to": date_to}, (INCOMES, EXPENSES),
+        lambda: _compute_trend(db, current_user.id, granularity, date_from, date_to),
+    )
+
+DASHBOARD_SECTIONS = ("summary", "categories", "trend", "wallets")
+
+async def _compute_dashboard(db: AsyncSession, user_id: int, sections, date_from, date_to, granularity, trend_from, trend_to):
+    body = {}
+    # summary and categories come out of the same aggregate statement
+    if "summary" in sections or "categories" in sections:
+        summary = await _compute_summary(db, user_id, date_from, date_to)
+        if "summary" in sections:
+            body["summary"] = summary
+        if "categories" in sections:
+            body["categories"] = summary["expense_by_category"]
+    if "trend" in sections:
+        body["trend"] = await _compute_trend(db, user_id, granularity, trend_from, trend_to)
+    if "wallets" in sections:
+        wallets = await db.execute(
+            select(Wallet.id, Wallet.name, Wallet.balance, Wallet.user_id).where(Wallet.user_id == user_id)
+        )
+        body["wallets"] = [dict(row._mapping) for row in wallets]
+    return body
+
+# Everything the dashboard renders, in one request and one DB session
+@router.get("/dashboard")
+async def get_dashboard(
+    request: Request,
+    include: str = ",".join(DASHBOARD_SECTIONS),
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    granularity: str = Query("month", pattern="^(day|week|month)$"),
+    trend_from: Optional[date] = None,
+    trend_to: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    sections = {part.strip() for part in include.split(",") if part.strip()}
+    unknown = sections - set(DASHBOARD_SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown include: {', '.join(sorted(unknown))}")
+    trend_from = trend_from or date_from
+    trend_to = trend_to or date_to
+    params = {
+        "include": ",".join(sorted(sections)), "from": date_from, "to": date_to,
+        "granularity": granularity, "trend_from": trend_from, "trend_to": trend_to,
+    }
+    return await _conditional_report(
+        request, db, current_user.id, "dashboard", params, (INCOMES, EXPENSES, WALLETS),
+        lambda: _compute_dashboard(db, current_user.id, sections, date_from, date_to, granularity, trend_from, trend_to),
+    )
+
+async def _compute_anomalies(db: AsyncSession, user_id: int, date_from: Optional[date], date_to: Optional[date], limit: int):
+    rows = await db.execute(
+        select(ExpenseAnomaly)
+        .where(ExpenseAnomaly.user_id == user_id, *_date_bounds(ExpenseAnomaly.date, date_from, date_to))
+        .order_by(ExpenseAnomaly.date.desc(), ExpenseAnomaly.expense_id.desc())
+        .limit(limit)
+    )
+    return [
+        {
+            "expense_id": a.expense_id, "date": a.date.isoformat() if a.date else None, "category": a.category,
+            "amount": a.amount, "expected": a.expected, "score": a.score,
+        }
+        for a in rows.scalars()
+    ]
+
+# Most recent expenses flagged as unusual when they were written
+@router.get("/anomalies")
+async def get_anomalies(
+    request: Request,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+):
+    return await _conditional_report(
+        request, db, current_user.id, "anomalies",
+        {"from": date_from, "to": date_to, "limit": limit}, (EXPENSES,),
+        lambda: _compute_anomalies(db, current_user.id, date_from, date_to, limit),
+    )
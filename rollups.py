@@ -0,0 +1,161 @@
+
+"""
+Daily rollups: one row per (user, day, kind, category) with the sum and count
+of the underlying incomes or expenses. Writes keep them current in the same
+transaction; reports read them, so their cost follows the days covered
+instead of the number of transactions.
+
+    python rollups.py rebuild [--user-id N ...]   # backfill rollups and expense stats from incomes/expenses
+    python rollups.py check                       # exit 1 if any rollup has drifted
+"""
+import argparse
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, exists, func, insert, literal, select, union_all, update
+from database import upsert_insert
+from models import DailyRollup, Income, Expense
+
+INCOME = "income"
+EXPENSE = "expense"
+
+# Money is stored as floats; sums within half a cent count as equal
+TOLERANCE = 0.005
+
+# Days of expense rollups forecasts are fitted on; older spending says little about next month
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "365"))
+
+_KEY = ("user_id", "date", "kind", "category")
+
+def history_start(today):
+    """First day of the forecast history window ending today."""
+    return today - timedelta(days=FORECAST_HISTORY_DAYS - 1)
+
+def to_day(value):
+    # Transactions arrive as datetimes or dates; everything derived from them is per day
+    return value.date() if isinstance(value, datetime) else value
+
+def delete_for_users(db, model, user_ids=None):
+    """Deletes a derived table's rows for the given users (or everyone); returns the user ids as a list."""
+    stmt = delete(model)
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        stmt = stmt.where(model.user_id.in_(user_ids))
+    db.execute(stmt)
+    return user_ids
+
+def add_to_rollups(db, user_id: int, kind: str, entries):
+    """
+    Adds (date, category, amount) entries to the user's rollups inside the
+    caller's transaction. Entries are pre-aggregated, so a batch costs one
+    statement per distinct (day, category), not one per row.
+    """
+    sums = defaultdict(lambda: [0.0, 0])
+    for day, category, amount in entries:
+        bucket = sums[(to_day(day), category or "")]
+        bucket[0] += amount
+        bucket[1] += 1
+    if not sums:
+        return
+    rows = [
+        {"user_id": user_id, "date": day, "kind": kind, "category": category, "total": total, "count": count}
+        for (day, category), (total, count) in sums.items()
+    ]
+
+    dialect_insert = upsert_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(DailyRollup)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=list(_KEY),
+            set_={"total": DailyRollup.total + stmt.excluded.total, "count": DailyRollup.count + stmt.excluded.count},
+        ), rows)
+        return
+    # Portable fallback, same shape as versioning.bump_version
+    for row in rows:
+        result = db.execute(
+            update(DailyRollup)
+            .where(*(getattr(DailyRollup, column) == row[column] for column in _KEY))
+            .values(total=DailyRollup.total + row["total"], count=DailyRollup.count + row["count"])
+        )
+        if result.rowcount == 0:
+            db.execute(insert(DailyRollup), [row])
+
+def _grouped_sources(user_ids=None):
+    # The rollup contents as they should be, computed from the raw tables
+    queries = []
+    for kind, model, category in ((INCOME, Income, Income.source), (EXPENSE, Expense, Expense.category)):
+        category = func.coalesce(category, "")
+        query = select(
+            model.user_id, model.date, literal(kind).label("kind"), category.label("category"),
+            func.sum(model.amount).label("total"), func.count(model.id).label("count"),
+        ).group_by(model.user_id, model.date, category)
+        if user_ids is not None:
+            query = query.where(model.user_id.in_(user_ids))
+        queries.append(query)
+    return queries
+
+def rebuild(db, user_ids=None) -> int:
+    """Recomputes rollups (for the given users, or everyone) from incomes and expenses. Caller commits."""
+    user_ids = delete_for_users(db, DailyRollup, user_ids)
+    columns = ["user_id", "date", "kind", "category", "total", "count"]
+    inserted = 0
+    for query in _grouped_sources(user_ids):
+        inserted += db.execute(insert(DailyRollup).from_select(columns, query)).rowcount
+    return inserted
+
+def check(db, user_ids=None):
+    """
+    Compares rollups with the raw tables in one statement; returns the
+    (user_id, date, kind, category, total_diff, count_diff) rows that disagree.
+    """
+    stored = select(
+        DailyRollup.user_id, DailyRollup.date, DailyRollup.kind, DailyRollup.category,
+        (-DailyRollup.total).label("total"), (-DailyRollup.count).label("count"),
+    )
+    if user_ids is not None:
+        stored = stored.where(DailyRollup.user_id.in_(list(user_ids)))
+    both = union_all(*_grouped_sources(user_ids), stored).subquery()
+    key = (both.c.user_id, both.c.date, both.c.kind, both.c.category)
+    total_diff, count_diff = func.sum(both.c.total), func.sum(both.c.count)
+    return db.execute(
+        select(*key, total_diff, count_diff)
+        .group_by(*key)
+        .having((func.abs(total_diff) > TOLERANCE) | (count_diff != 0))
+        .order_by(*key)
+    ).all()
+
+def backfill_if_needed(db) -> bool:
+    """Builds rollups for existing data the first time the table is empty; returns True if it did."""
+    if db.scalar(select(exists().select_from(DailyRollup))):
+        return False
+    if not (db.scalar(select(exists().select_from(Income))) or db.scalar(select(exists().select_from(Expense)))):
+        return False
+    rebuild(db)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("rebuild", "check"))
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids", help="limit to these users (repeatable)")
+    args = parser.parse_args()
+
+    from database import SessionLocal, init_db
+    init_db()
+    with SessionLocal() as db:
+        if args.command == "rebuild":
+            # Expense stats are derived from the same tables, so they are rebuilt alongside
+            from anomalies import rebuild as rebuild_expense_stats
+            rows = rebuild(db, args.user_ids)
+            stats = rebuild_expense_stats(db, args.user_ids)
+            db.commit()
+            print(f"Rebuilt {rows} rollup rows and {stats} expense stat rows")
+            return
+        mismatches = check(db, args.user_ids)
+    for user_id, day, kind, category, total_diff, count_diff in mismatches[:50]:
+        print(f"user {user_id} {day} {kind}/{category}: total off by {total_diff:+.2f}, count off by {count_diff:+d}")
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} rollup rows disagree with the raw tables; run `python rollups.py rebuild`")
+    print("Rollups match incomes and expenses")
+
+if __name__ == "__main__":
+    main()
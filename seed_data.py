@@ -1,89 +1,176 @@
 
-from database import SessionLocal
-from models import User, Wallet, Income, Expense
-from auth import hash_password
+"""
+Seeds demo or production-scale data.
+
+    python seed_data.py                                   # demo user, 60 days
+    python seed_data.py --users 1000 --days 365 --per-day 5 --seed 7
+
+Users are demo@example.com (user 0) and user<N>@example.com, all with the same
+password. Rows are generated deterministically from --seed and written with
+bulk Core inserts in batches of --batch-size; the password is hashed once,
+wallet balances are set from the generated transactions and the report
+rollups are rebuilt for the seeded users. Their data versions are bumped, so
+a running server doesn't keep serving cached reports for replaced data.
+"""
+import argparse
 import datetime
 import random
+import time
 
-db = SessionLocal()
+from sqlalchemy import bindparam, delete, func, insert, select, update
 
-def seed():
-    print("Seeding data...")
-    
-    # 1. Create/Get User
-    email = "demo@example.com"
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        print(f"Creating user: {email} / password123")
-        user = User(
-            name="Demo User",
-            email=email,
-            password_hash=hash_password("password123")
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-    else:
-        print(f"User exists: {email}. Updating password to 'password123'...")
-        user.password_hash = hash_password("password123")
-        db.commit()
-
-    # 2. Create Wallet
-    wallet = db.query(Wallet).filter(Wallet.user_id == user.id).first()
-    if not wallet:
-        print("Creating wallet...")
-        wallet = Wallet(name="Main Wallet", balance=5000, user_id=user.id)
-        db.add(wallet)
-        db.commit()
-        db.refresh(wallet)
-
-    # 3. Add Transactions (Historical & Recent)
-    print("Adding 50+ transactions...")
-    today = datetime.date.today()
-    
-    # Income Sources
-    sources = ["Salary", "Freelance", "Dividend", "Gift"]
-    # Expense Categories
-    categories = ["Food", "Transport", "Rent", "Entertainment", "Utilities", "Shopping"]
+from database import engine, init_db
+from models import User, Wallet, Income, Expense, DailyRollup, ExpenseAnomaly, ExpenseStat, Budget, DataVersion, Forecast
+from auth import hash_password
+from rollups import rebuild as rebuild_rollups
+from anomalies import rebuild as rebuild_expense_stats
+from versioning import INCOMES, EXPENSES, WALLETS, FORECASTS
 
-    for i in range(60): # Past 60 days
+# Income Sources
+SOURCES = ["Salary", "Freelance", "Dividend", "Gift"]
+# Expense Categories
+CATEGORIES = ["Food", "Transport", "Rent", "Entertainment", "Utilities", "Shopping"]
+
+def seed_email(n: int) -> str:
+    return "demo@example.com" if n == 0 else f"user{n}@example.com"
+
+def _versions(conn, user_ids):
+    rows = conn.execute(
+        select(DataVersion.user_id, DataVersion.scope, DataVersion.version).where(DataVersion.user_id.in_(user_ids))
+    )
+    return {(user_id, scope): version for user_id, scope, version in rows}
+
+def _reset_users(conn, emails):
+    """Deletes the seed users and all their rows; returns how many, and the data versions they had."""
+    user_ids = list(conn.scalars(select(User.id).where(User.email.in_(emails))))
+    if not user_ids:
+        return 0, {}
+    versions = _versions(conn, user_ids)
+    for model in (Income, ExpenseAnomaly, Expense, DailyRollup, ExpenseStat, Budget, Forecast, DataVersion, Wallet):
+        conn.execute(delete(model).where(model.user_id.in_(user_ids)))
+    conn.execute(delete(User).where(User.id.in_(user_ids)))
+    return len(user_ids), versions
+
+def _bump_versions(conn, user_ids, previous):
+    """
+    Starts the seeded users' data versions past any their ids had before, so a
+    running server's cached reports and ETags can't match the new data.
+    """
+    user_ids = list(user_ids)
+    previous = {**previous, **_versions(conn, user_ids)}
+    conn.execute(delete(DataVersion).where(DataVersion.user_id.in_(user_ids)))
+    conn.execute(insert(DataVersion), [
+        {"user_id": user_id, "scope": scope, "version": previous.get((user_id, scope), 0) + 1}
+        for user_id in user_ids for scope in (INCOMES, EXPENSES, WALLETS, FORECASTS)
+    ])
+
+def _transactions(rng, user_id, wallet_id, days, per_day, today):
+    """Yields ("income"|"expense", row) for one user; expenses daily, income every 15 days."""
+    for i in range(days):
         date = today - datetime.timedelta(days=i)
-        
-        # Add Expense (Daily logic: Random chance)
-        if random.random() > 0.3: # 70% chance of spending
-            amount = round(random.uniform(10, 150), 2)
-            cat = random.choice(categories)
-            expense = Expense(
-                amount=amount,
-                category=cat,
-                date=date,
-                user_id=user.id,
-                wallet_id=wallet.id
-            )
-            wallet.balance -= amount
-            db.add(expense)
-
-        # Add Income (Weekly logic)
-        if i % 15 == 0: # Every 15 days
-            amount = round(random.uniform(2000, 3000), 2)
-            income = Income(
-                amount=amount,
-                source=random.choice(sources),
-                date=date,
-                user_id=user.id,
-                wallet_id=wallet.id
-            )
-            wallet.balance += amount
-            db.add(income)
-
-    db.commit()
-    print("Data seeded successfully!")
-    print(f"Login with: {email} / password123")
+        for _ in range(per_day):
+            # ~70% chance of spending per slot, as in the original demo data
+            if rng.random() < 0.7:
+                yield "expense", {
+                    "user_id": user_id, "wallet_id": wallet_id, "date": date,
+                    "category": rng.choice(CATEGORIES), "amount": round(rng.uniform(10, 150), 2),
+                }
+        if i % 15 == 0:
+            yield "income", {
+                "user_id": user_id, "wallet_id": wallet_id, "date": date,
+                "source": rng.choice(SOURCES), "amount": round(rng.uniform(2000, 3000), 2),
+            }
+
+def seed(users=1, days=60, per_day=1, seed=42, batch_size=50000, password="password123", reset=False, defer_indexes=False):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    emails = [seed_email(n) for n in range(users)]
+    init_db()
+
+    with engine.begin() as conn:
+        existing = conn.scalar(select(func.count()).select_from(User).where(User.email.in_(emails)))
+        if existing and not reset:
+            raise SystemExit(f"{existing} seed users already exist; rerun with --reset to replace them")
+        previous_versions = {}
+        if reset:
+            removed, previous_versions = _reset_users(conn, emails)
+            print(f"Removed {removed} existing seed users")
+
+        print(f"Creating {users} users (password: {password})...")
+        password_hash = hash_password(password)  # bcrypt once, shared by every seeded user
+        first_user = (conn.scalar(select(func.max(User.id))) or 0) + 1
+        first_wallet = (conn.scalar(select(func.max(Wallet.id))) or 0) + 1
+        conn.execute(insert(User), [
+            {"id": first_user + n, "name": "Demo User" if n == 0 else f"User {n}", "email": email, "password_hash": password_hash}
+            for n, email in enumerate(emails)
+        ])
+        conn.execute(insert(Wallet), [
+            {"id": first_wallet + n, "user_id": first_user + n, "name": "Main Wallet", "balance": 5000}
+            for n in range(users)
+        ])
+
+        # Building secondary indexes once after the load beats updating them per row
+        deferred = [index for model in (Income, Expense) for index in model.__table__.indexes] if defer_indexes else []
+        for index in deferred:
+            index.drop(bind=conn)
+
+        print(f"Adding transactions ({days} days x {per_day} per day per user)...")
+        buffers = {"income": [], "expense": []}
+        tables = {"income": Income, "expense": Expense}
+        counts = {"income": 0, "expense": 0}
+        balances = []
+
+        def flush(kind):
+            if buffers[kind]:
+                conn.execute(insert(tables[kind]), buffers[kind])
+                counts[kind] += len(buffers[kind])
+                buffers[kind] = []
+
+        for n in range(users):
+            balance = 5000.0
+            for kind, row in _transactions(rng, first_user + n, first_wallet + n, days, per_day, today):
+                balance += row["amount"] if kind == "income" else -row["amount"]
+                buffers[kind].append(row)
+                if len(buffers[kind]) >= batch_size:
+                    flush(kind)
+            balances.append({"wallet_id": first_wallet + n, "new_balance": round(balance, 2)})
+        flush("income")
+        flush("expense")
+        for index in deferred:
+            index.create(bind=conn)
+
+        # Report rollups for the new rows, aggregated by the database in two INSERT ... SELECTs
+        rebuild_rollups(conn, range(first_user, first_user + users))
+        rebuild_expense_stats(conn, range(first_user, first_user + users))
+
+        # Wallet balances consistent with the generated history, in one executemany
+        conn.execute(
+            update(Wallet).where(Wallet.id == bindparam("wallet_id")).values(balance=bindparam("new_balance")),
+            balances,
+        )
+        _bump_versions(conn, range(first_user, first_user + users), previous_versions)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--per-day", type=int, default=1, help="expense slots per user per day")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed; same seed, same data")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--reset", action="store_true", help="delete existing seed users and their data first")
+    parser.add_argument("--defer-indexes", action="store_true", help="drop transaction indexes during the load and rebuild after")
+    args = parser.parse_args()
+
+    print("Seeding data...")
+    start = time.perf_counter()
+    counts = seed(args.users, args.days, args.per_day, args.seed, args.batch_size, args.password, args.reset, args.defer_indexes)
+    elapsed = time.perf_counter() - start
+    rows = counts["income"] + counts["expense"]
+    print(f"Data seeded successfully! {counts['expense']} expenses, {counts['income']} incomes "
+          f"in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    print(f"Login with: {seed_email(0)} / {args.password}")
 
 if __name__ == "__main__":
-    try:
-        seed()
-    except Exception as e:
-        print(f"Error: {e}")
-    finally:
-        db.close()
+    main()
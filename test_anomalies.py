@@ -0,0 +1,79 @@
+import statistics
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from testutil import ApiTestCase, DatabaseTestCase
+from models import ExpenseAnomaly, ExpenseStat
+from expense import ExpenseCreate, bulk_insert_expenses
+from anomalies import ALL_DAYS, rebuild, record_expenses
+
+class TestAnomalies(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.amounts = [20 + (i * 7) % 11 for i in range(30)]
+        start = datetime(2024, 1, 1, 12)
+        self.expenses = [
+            ExpenseCreate(amount=amount, category="Food", date=start + timedelta(days=i), wallet_id=1)
+            for i, amount in enumerate(self.amounts)
+        ]
+
+    def _stat(self, db, weekday=ALL_DAYS):
+        return db.execute(
+            select(ExpenseStat.count, ExpenseStat.mean, ExpenseStat.m2)
+            .where(ExpenseStat.user_id == 1, ExpenseStat.category == "Food", ExpenseStat.weekday == weekday)
+        ).one()
+
+    def test_incremental_stats_match_rebuild(self):
+        with self.Session() as db:
+            bulk_insert_expenses(db, 1, self.expenses[:10])
+            bulk_insert_expenses(db, 1, self.expenses[10:])  # merged into the stored stats
+            db.commit()
+            count, mean, m2 = self._stat(db)
+            self.assertEqual(count, 30)
+            self.assertAlmostEqual(mean, statistics.mean(self.amounts))
+            self.assertAlmostEqual(m2 / (count - 1), statistics.variance(self.amounts))
+            incremental = {row[:3]: row[3:] for row in db.execute(select(
+                ExpenseStat.user_id, ExpenseStat.category, ExpenseStat.weekday, ExpenseStat.count, ExpenseStat.mean, ExpenseStat.m2,
+            ))}
+            rebuild(db)
+            db.commit()
+            for key, (count, mean, m2) in incremental.items():
+                rebuilt = db.execute(select(ExpenseStat.count, ExpenseStat.mean, ExpenseStat.m2).where(
+                    ExpenseStat.user_id == key[0], ExpenseStat.category == key[1], ExpenseStat.weekday == key[2],
+                )).one()
+                self.assertEqual(rebuilt[0], count, key)
+                self.assertAlmostEqual(rebuilt[1], mean, msg=key)
+                self.assertAlmostEqual(rebuilt[2], m2, places=6, msg=key)
+
+    def test_outlier_is_scored_and_flagged(self):
+        with self.Session() as db:
+            bulk_insert_expenses(db, 1, self.expenses)
+            [usual, spike], _ = bulk_insert_expenses(db, 1, [
+                ExpenseCreate(amount=25, category="Food", date=datetime(2024, 3, 1), wallet_id=1),
+                ExpenseCreate(amount=400, category="Food", date=datetime(2024, 3, 2), wallet_id=1),
+            ])
+            db.commit()
+            flagged = db.scalars(select(ExpenseAnomaly)).all()
+            self.assertEqual([a.expense_id for a in flagged], [spike])
+            self.assertGreater(flagged[0].score, 3)
+            # Too little history in a new category: not scored
+            self.assertEqual(record_expenses(db, 1, [(None, datetime(2024, 3, 3), "Travel", 900)]), [None])
+
+class TestAnomalyApi(ApiTestCase):
+    def test_score_is_only_returned_by_create(self):
+        with self.Session() as db:
+            bulk_insert_expenses(db, 1, [
+                ExpenseCreate(amount=20 + i % 5, category="Food", date=datetime(2024, 1, 1 + i), wallet_id=1) for i in range(20)
+            ])
+            db.commit()
+        res = self.client.post("/expense/", json={"amount": 400, "category": "Food", "date": "2024-02-01T00:00:00"}, headers=self.headers)
+        self.assertGreater(res.json()["anomaly_score"], 3)
+        self.assertEqual(res.json()["budget_alerts"], [])
+        # Listed rows were never scored on the way out, so they don't claim a score
+        listed = self.client.get("/expense/", params={"limit": 1}, headers=self.headers).json()
+        self.assertEqual(listed[0]["id"], res.json()["id"])
+        self.assertNotIn("anomaly_score", listed[0])
+        self.assertNotIn("budget_alerts", listed[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+from models import User
+from auth import AUTH_CACHE_TTL_SECONDS, auth_cache, create_access_token, get_current_user
+from testutil import DatabaseTestCase
+
+class TestAuthCache(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        auth_cache.clear()
+
+    def tearDown(self):
+        auth_cache.clear()
+        super().tearDown()
+
+    def _current_user(self, token):
+        async def resolve():
+            async with self.AsyncSession() as db:
+                return await get_current_user(token, db)
+        return asyncio.run(resolve())
+
+    def _remaining_ttl(self, token):
+        return auth_cache._data[token][1] - time.monotonic()
+
+    def test_second_lookup_is_a_cache_hit(self):
+        token = create_access_token({"sub": "test@example.com"})
+        hits, misses = auth_cache.hits, auth_cache.misses
+        first = self._current_user(token)
+        second = self._current_user(token)
+        self.assertEqual((first.id, second.id), (1, 1))
+        self.assertIs(second, first)
+        self.assertEqual((auth_cache.hits - hits, auth_cache.misses - misses), (1, 1))
+
+    def test_entry_never_outlives_the_token(self):
+        short = create_access_token({"sub": "test@example.com"}, expires_delta=timedelta(seconds=30))
+        self._current_user(short)
+        self.assertLessEqual(self._remaining_ttl(short), 30)
+        long = create_access_token({"sub": "test@example.com"}, expires_delta=timedelta(days=1))
+        self._current_user(long)
+        self.assertLessEqual(self._remaining_ttl(long), AUTH_CACHE_TTL_SECONDS)
+        self.assertGreater(self._remaining_ttl(long), 30)
+
+    def test_credential_changes_evict_cached_tokens(self):
+        for column, value in (("password_hash", "changed"), ("is_active", False)):
+            token = create_access_token({"sub": "test@example.com", "case": column})
+            self._current_user(token)
+            self.assertIsNotNone(auth_cache.get(token))
+            with self.Session() as db:
+                setattr(db.get(User, 1), column, value)
+                db.commit()
+            self.assertIsNone(auth_cache.get(token), column)
+
+    def test_inactive_user_is_rejected(self):
+        from fastapi import HTTPException
+        with self.Session() as db:
+            db.get(User, 1).is_active = False
+            db.commit()
+        with self.assertRaises(HTTPException) as raised:
+            self._current_user(create_access_token({"sub": "test@example.com"}))
+        self.assertEqual(raised.exception.status_code, 401)
+
+if __name__ == "__main__":
+    unittest.main()
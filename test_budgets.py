@@ -0,0 +1,96 @@
+import unittest
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from testutil import ApiTestCase, DatabaseTestCase
+from models import Budget, User
+from expense import ExpenseCreate, bulk_insert_expenses
+
+class TestBudgets(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.Session() as db:
+            db.add(Budget(id=1, user_id=1, month="2024-03", category=None, limit=100, spent=0))
+            db.add(Budget(id=2, user_id=1, month="2024-03", category="Food", limit=50, spent=0))
+            db.add(Budget(id=3, user_id=1, month="2024-04", category=None, limit=100, spent=0))
+            db.commit()
+
+    def _spend(self, db, *expenses):
+        _, alerts = bulk_insert_expenses(db, 1, [
+            ExpenseCreate(amount=amount, category=category, date=datetime(2024, 3, day), wallet_id=1)
+            for day, category, amount in expenses
+        ])
+        db.commit()
+        return [(alert.budget_id, alert.threshold) for alert in alerts]
+
+    def test_counters_follow_matching_expenses(self):
+        with self.Session() as db:
+            self._spend(db, (1, "Food", 10), (2, "Rent", 30), (3, "Food", 5))
+            spent = dict(db.execute(select(Budget.id, Budget.spent)).all())
+            self.assertEqual(spent, {1: 45, 2: 15, 3: 0})
+
+    def test_alerts_only_when_a_threshold_is_crossed(self):
+        with self.Session() as db:
+            self.assertEqual(self._spend(db, (1, "Food", 30)), [])
+            self.assertEqual(self._spend(db, (2, "Food", 15)), [(2, 0.8)])  # 45 of 50
+            self.assertEqual(self._spend(db, (3, "Food", 1)), [])
+            # One batch can cross several thresholds of several budgets
+            self.assertEqual(self._spend(db, (4, "Food", 10), (5, "Rent", 60)), [(1, 0.8), (1, 1.0), (2, 1.0)])
+
+    def test_one_budget_per_month_and_category(self):
+        for category in (None, "Food"):
+            with self.Session() as db:
+                db.add(Budget(user_id=1, month="2024-03", category=category, limit=10))
+                with self.assertRaises(IntegrityError):
+                    db.commit()
+
+class TestBudgetApi(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.Session() as db:
+            bulk_insert_expenses(db, 1, [
+                ExpenseCreate(amount=amount, category=category, date=datetime(2024, month, 10), wallet_id=1)
+                for month, category, amount in ((3, "Food", 20), (3, "Rent", 70), (4, "Food", 5))
+            ])
+            db.add(User(id=2, name="Other", email="other@example.com", password_hash="x"))
+            db.add(Budget(id=9, user_id=2, month="2024-03", category=None, limit=10, spent=0))
+            db.commit()
+
+    def _create(self, **budget):
+        return self.client.post("/budget/", json={"month": "2024-03", "limit": 100, **budget}, headers=self.headers)
+
+    def _spend(self, db, when, category, amount):
+        bulk_insert_expenses(db, 1, [ExpenseCreate(amount=amount, category=category, date=when, wallet_id=1)])
+        db.commit()
+
+    def test_create_seeds_spent_from_the_month(self):
+        self.assertEqual(self._create().json()["spent"], 90)
+        self.assertEqual(self._create(category="Food").json()["spent"], 20)
+        self.assertEqual(self._create(month="2024-05").json()["spent"], 0)
+        # Writes after creation go through the counter
+        with self.Session() as db:
+            self._spend(db, datetime(2024, 3, 11), "Food", 3)
+        spent = {(b["month"], b["category"]): b["spent"] for b in self.client.get("/budget/", headers=self.headers).json()}
+        self.assertEqual(spent, {("2024-03", None): 93, ("2024-03", "Food"): 23, ("2024-05", None): 0})
+
+    def test_duplicate_create_is_a_conflict(self):
+        self.assertEqual(self._create(category="Food").status_code, 200)
+        self.assertEqual(self._create(category="Food").status_code, 409)
+        self.assertEqual(self._create().status_code, 200)
+        self.assertEqual(self._create().status_code, 409)
+        self.assertEqual(len(self.client.get("/budget/", headers=self.headers).json()), 2)
+
+    def test_update_and_delete_only_own_budgets(self):
+        self.assertEqual(self.client.put("/budget/9", json={"limit": 1}, headers=self.headers).status_code, 404)
+        self.assertEqual(self.client.delete("/budget/9", headers=self.headers).status_code, 404)
+        with self.Session() as db:
+            self.assertEqual(db.get(Budget, 9).limit, 10)
+
+        budget_id = self._create().json()["id"]
+        res = self.client.put(f"/budget/{budget_id}", json={"limit": 250}, headers=self.headers)
+        self.assertEqual((res.status_code, res.json()["limit"], res.json()["spent"]), (200, 250, 90))
+        self.assertEqual(self.client.delete(f"/budget/{budget_id}", headers=self.headers).status_code, 204)
+        self.assertEqual(self.client.get(f"/budget/{budget_id}", headers=self.headers).status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import datetime
+import unittest
+import numpy as np
+from ml_engine import MIN_SEASONAL_DAYS, _to_day_numbers, fit_categories, project
+from rollups import FORECAST_HISTORY_DAYS
+
+END = datetime.date(2024, 3, 31)  # a Sunday
+END_DAY = int(_to_day_numbers([END])[0])
+
+def _series(days, *categories):
+    """
+    Stacks per-category daily amount functions f(i, weekday) over the `days`
+    days ending at END into the (day numbers, category index, amounts, names)
+    arrays fit_categories takes. Days where f returns 0 are left out, as in
+    the rollup table.
+    """
+    day_numbers, index, amounts = [], [], []
+    for c, amount_on in enumerate(categories):
+        for i in range(days):
+            day = END_DAY - days + 1 + i
+            amount = amount_on(i, (day + 3) % 7)
+            if amount:
+                day_numbers.append(day)
+                index.append(c)
+                amounts.append(amount)
+    names = [f"c{c}" for c in range(len(categories))]
+    return np.array(day_numbers), np.array(index), np.array(amounts, dtype=np.float64), names
+
+def _noise(i):
+    return (i * 37) % 11 - 5
+
+class TestForecastModel(unittest.TestCase):
+    def test_recovers_slope_and_weekday_effect(self):
+        # 0.5 a day more each day, +20 on Saturdays (weekday 5)
+        model = fit_categories(*_series(56, lambda i, wd: 10 + 0.5 * i + (20 if wd == 5 else 0)), END_DAY)
+        self.assertTrue(model.seasonal)
+        coefficients = model.coefficients[:, 0]
+        self.assertAlmostEqual(coefficients[1], 0.5)
+        # Columns 2..7 are Tue..Sun against Monday
+        np.testing.assert_allclose(coefficients[2:], [0, 0, 0, 0, 20, 0], atol=1e-9)
+        self.assertAlmostEqual(model.sigma[0], 0)
+
+        saturday = project(model, 7, start=END)["by_category"]["c0"][5]
+        self.assertEqual(saturday["date"], "2024-04-06")
+        self.assertAlmostEqual(saturday["predicted_amount"], 10 + 0.5 * (56 + 5) + 20, places=2)
+
+    def test_days_without_spend_count_as_zero(self):
+        # The window runs from the first spend to END: one 50 over ten days is a level of 5 a day
+        model = fit_categories(*_series(10, lambda i, wd: 50 if i == 0 else 0), END_DAY)
+        self.assertAlmostEqual(model.coefficients[0, 0], 5)
+
+    def test_history_window_drops_older_days(self):
+        # Older spend is ignored; the window is then the full history length, zero-filled
+        recent = _series(30, lambda i, wd: 10)
+        def adding(day, amount):
+            return [np.append(recent[0], day), np.append(recent[1], 0), np.append(recent[2], amount), recent[3]]
+        with_old = fit_categories(*adding(END_DAY - FORECAST_HISTORY_DAYS - 5, 10000), END_DAY)
+        window = fit_categories(*adding(END_DAY - FORECAST_HISTORY_DAYS + 1, 0), END_DAY)
+        np.testing.assert_allclose(with_old.coefficients, window.coefficients)
+        self.assertLess(with_old.coefficients[0, 0], 10)
+
+    def test_total_is_the_sum_of_categories(self):
+        model = fit_categories(*_series(
+            60,
+            lambda i, wd: 30 + _noise(i) + (15 if wd == 4 else 0),
+            lambda i, wd: 20 + 0.2 * i + _noise(i + 3),
+            lambda i, wd: 40 if wd == 0 else 0,
+        ), END_DAY)
+        forecast = project(model, 14, start=END)
+        for t, point in enumerate(forecast["forecast"]):
+            parts = sum(series[t]["predicted_amount"] for series in forecast["by_category"].values())
+            self.assertAlmostEqual(point["predicted_amount"], parts, delta=0.02)
+
+    def test_intervals_widen_with_the_horizon(self):
+        model = fit_categories(*_series(60, lambda i, wd: 30 + _noise(i) + (10 if wd == 6 else 0)), END_DAY)
+        points = project(model, 63, start=END)["forecast"]
+        widths = [p["upper"] - p["lower"] for p in points]
+        self.assertGreater(widths[0], 0)
+        # Same weekday, further out: wider
+        for k in range(7, 63, 7):
+            self.assertGreater(widths[k], widths[k - 7])
+        for p in points:
+            self.assertLessEqual(p["lower"], p["predicted_amount"])
+            self.assertLessEqual(p["predicted_amount"], p["upper"])
+
+    def test_short_history_fits_trend_only(self):
+        model = fit_categories(*_series(MIN_SEASONAL_DAYS - 1, lambda i, wd: 5 + i), END_DAY)
+        self.assertFalse(model.seasonal)
+        self.assertEqual(model.coefficients.shape, (2, 1))
+        self.assertAlmostEqual(model.coefficients[1, 0], 1)
+        self.assertEqual(project(model, 3, start=END)["model"], "trend")
+        self.assertTrue(fit_categories(*_series(MIN_SEASONAL_DAYS, lambda i, wd: 5 + i), END_DAY).seasonal)
+
+    def test_no_model_gives_an_empty_forecast(self):
+        self.assertEqual(project(None, 7), {"forecast": [], "by_category": {}, "model": None})
+
+if __name__ == "__main__":
+    unittest.main()
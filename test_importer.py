@@ -0,0 +1,114 @@
+import unittest
+from datetime import date
+from unittest import mock
+from sqlalchemy import select
+import importer
+from models import Expense, Income
+from testutil import ApiTestCase
+
+class TestImporter(ApiTestCase):
+    def _import(self, name, content, **params):
+        res = self.client.post(
+            "/import/statement", params=params, headers=self.headers,
+            files={"file": (name, content.encode(), "text/plain")},
+        )
+        self.assertEqual(res.status_code, 200, res.text)
+        return res.json()
+
+    def _stored(self):
+        with self.Session() as db:
+            incomes = db.execute(select(Income.date, Income.amount, Income.source).order_by(Income.id)).all()
+            expenses = db.execute(select(Expense.date, Expense.amount, Expense.category).order_by(Expense.id)).all()
+        as_rows = lambda rows: [(d.isoformat(), a, desc) for d, a, desc in rows]
+        return as_rows(incomes), as_rows(expenses)
+
+    def test_csv_signed_amounts_and_type_column(self):
+        summary = self._import("s.csv", (
+            "Date,Amount,Type,Description\n"
+            "2024-03-01,-12.50,,Food\n"
+            "02/03/2024,1000,,Salary\n"
+            "2024-03-03,40,debit,Rent\n"
+            "2024-03-04,-5,credit,Refund\n"
+            "2024-03-05,,,Empty\n"
+        ))
+        self.assertEqual(summary["inserted"], {"income": 2, "expense": 2})
+        self.assertEqual(summary["skipped"], 1)
+        incomes, expenses = self._stored()
+        self.assertEqual(incomes, [("2024-03-02", 1000, "Salary"), ("2024-03-04", 5, "Refund")])
+        self.assertEqual(expenses, [("2024-03-01", 12.5, "Food"), ("2024-03-03", 40, "Rent")])
+
+    def test_csv_debit_and_credit_columns(self):
+        summary = self._import("s.csv", (
+            "date,narration,debit,credit\n"
+            "2024-03-01,Groceries,\"1,200.00\",\n"
+            "2024-03-02,Salary,,3000\n"
+        ))
+        self.assertEqual(summary["inserted"], {"income": 1, "expense": 1})
+        self.assertEqual(self._stored(), ([("2024-03-02", 3000, "Salary")], [("2024-03-01", 1200, "Groceries")]))
+
+    def test_csv_bad_date_is_skipped_and_reported(self):
+        summary = self._import("s.csv", (
+            "date,amount,description\n"
+            "2024-03-01,-10,Food\n"
+            "31.03.2024,-20,Food\n"
+            ",-30,Food\n"
+        ))
+        self.assertEqual(summary["skipped"], 1)
+        self.assertEqual([error["line"] for error in summary["errors"]], [3])
+        # A missing date still means today; an unreadable one is never stored under today
+        _, expenses = self._stored()
+        self.assertEqual(expenses, [("2024-03-01", 10, "Food"), (date.today().isoformat(), 30, "Food")])
+
+    def test_csv_bad_amount_is_skipped_and_reported(self):
+        summary = self._import("s.csv", (
+            "date,description,debit,credit\n"
+            "2024-03-01,Food,12..5,\n"
+            "2024-03-02,Salary,,abc\n"
+            "2024-03-03,Rent,700,\n"
+        ))
+        self.assertEqual(summary["skipped"], 2)
+        self.assertEqual([(e["line"], e["detail"]) for e in summary["errors"]], [
+            (2, "Unrecognised amount '12..5'"), (3, "Unrecognised amount 'abc'"),
+        ])
+        self.assertEqual(self._stored(), ([], [("2024-03-03", 700, "Rent")]))
+
+    def test_text_lines_with_and_without_a_leading_date(self):
+        summary = self._import("s.txt", "2024-03-01 spent 200 on food\nsalary 1000 received\nnothing here\n")
+        self.assertEqual(summary["format"], "text")
+        self.assertEqual(summary["skipped"], 1)
+        incomes, expenses = self._stored()
+        self.assertEqual(expenses, [("2024-03-01", 200, "Food")])
+        self.assertEqual(incomes, [(date.today().isoformat(), 1000, "Uncategorized")])
+
+    def test_reimport_skips_stored_rows(self):
+        content = "date,amount,description\n2024-03-01,-10,Food\n2024-03-02,500,Salary\n"
+        self._import("s.csv", content)
+        summary = self._import("s.csv", content)
+        self.assertEqual(summary["duplicates"], 2)
+        self.assertEqual(summary["inserted"], {"income": 0, "expense": 0})
+
+    def test_reimport_of_a_multi_year_statement(self):
+        # Unsorted, years apart, and looked up one key at a time
+        content = "date,amount,description\n2021-01-05,-10,Food\n2024-03-01,-10,Food\n2022-07-09,900,Salary\n2021-01-05,-10,Food\n"
+        self._import("s.csv", content)
+        with mock.patch.object(importer, "DEDUPE_BATCH_KEYS", 1):
+            summary = self._import("s.csv", content + "2023-02-02,-10,Food\n")
+        self.assertEqual((summary["duplicates"], summary["inserted"]), (4, {"income": 0, "expense": 1}))
+
+    def test_identical_rows_in_one_file_are_kept(self):
+        content = "date,amount,description\n2024-03-01,-3.5,Coffee\n2024-03-01,-3.5,Coffee\n"
+        self.assertEqual(self._import("s.csv", content)["inserted"]["expense"], 2)
+        # Only as many are skipped as are stored: a third coffee is new
+        summary = self._import("s.csv", content + "2024-03-01,-3.5,Coffee\n")
+        self.assertEqual((summary["duplicates"], summary["inserted"]["expense"]), (2, 1))
+        self.assertEqual(len(self._stored()[1]), 3)
+
+    def test_repeats_across_chunks_are_kept(self):
+        content = "date,amount,description\n" + "2024-03-01,-3.5,Coffee\n" * 3
+        with mock.patch.object(importer, "CHUNK_LINES", 1):
+            summary = self._import("s.csv", content)
+        self.assertEqual(len(summary["progress"]), 3)
+        self.assertEqual((summary["duplicates"], summary["inserted"]["expense"]), (0, 3))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from database import engine
+from metrics import Metrics, RequestStats, _current_request
+
+class TestMetrics(unittest.TestCase):
+    def test_queries_are_counted_for_the_current_request(self):
+        stats = RequestStats(record_statements=True)
+        token = _current_request.set(stats)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+        finally:
+            _current_request.reset(token)
+        self.assertEqual(stats.queries, 2)
+        self.assertEqual([sql for _, sql in stats.statements], ["SELECT 1", "SELECT 2"])
+
+        # Outside a request nothing is attributed
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 3"))
+        self.assertEqual(stats.queries, 2)
+
+    def test_failed_statements_are_counted_and_leave_nothing_behind(self):
+        stats = RequestStats(record_statements=True)
+        token = _current_request.set(stats)
+        try:
+            with engine.connect() as conn:
+                for _ in range(3):
+                    with self.assertRaises(OperationalError):
+                        conn.execute(text("SELECT * FROM no_such_table"))
+                conn.execute(text("SELECT 1"))
+                self.assertNotIn("query_start", conn.info)
+        finally:
+            _current_request.reset(token)
+        self.assertEqual((stats.queries, stats.db_errors), (4, 3))
+        self.assertEqual(stats.statements[-1][1], "SELECT 1")
+
+        metrics = Metrics()
+        metrics.observe("GET", "/report/summary", 500, 0.01, stats)
+        self.assertIn('wisemoney_db_errors_total{method="GET",route="/report/summary"} 3', metrics.render())
+
+    def test_render_histogram_buckets_are_cumulative(self):
+        metrics = Metrics()
+        stats = RequestStats()
+        stats.queries = 3
+        metrics.observe("GET", "/report/summary", 200, 0.02, stats)
+        metrics.observe("GET", "/report/summary", 304, 0.2, stats)
+        body = metrics.render()
+        self.assertIn('wisemoney_http_request_duration_seconds_bucket{method="GET",route="/report/summary",le="0.025"} 1', body)
+        self.assertIn('wisemoney_http_request_duration_seconds_bucket{method="GET",route="/report/summary",le="0.25"} 2', body)
+        self.assertIn('wisemoney_http_request_duration_seconds_count{method="GET",route="/report/summary"} 2', body)
+        self.assertIn('wisemoney_db_queries_per_request_sum{method="GET",route="/report/summary"} 6.000000', body)
+        self.assertIn('wisemoney_http_responses_total{method="GET",route="/report/summary",status="304"} 1', body)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+
+import unittest
+from nlp_engine import TransactionParser
+
+class TestTransactionParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = TransactionParser()
+
+    def test_keywords_match_whole_words_only(self):
+        result = self.parser.parse("forgot to log 40 for parking")
+        self.assertEqual(result["type"], "Expense")
+        self.assertEqual(result["confidence"], 0.5)
+        self.assertEqual(result["category"], "Forgot Log Parking")
+
+    def test_income_and_expense(self):
+        self.assertEqual(self.parser.parse("Received 5000 salary")["type"], "Income")
+        result = self.parser.parse("paid 120.50 for uber to airport")
+        self.assertEqual((result["type"], result["amount"], result["category"]), ("Expense", 120.5, "Uber Airport"))
+
+    def test_inflected_keywords_from_bank_messages(self):
+        cases = [
+            ("INR 500 deposited to your account", "Income"),
+            ("Rs 2500 credited to your account", "Income"),
+            ("Purchased groceries for 300", "Expense"),
+            ("coffee costs 4", "Expense"),
+            ("INR 1200 debited from your account", "Expense"),
+        ]
+        for text, kind in cases:
+            result = self.parser.parse(text)
+            self.assertEqual((result["type"], result["confidence"]), (kind, 0.8), text)
+        self.assertEqual(self.parser.parse("Purchased groceries for 300")["category"], "Groceries")
+        # A card name is not a credit
+        self.assertEqual(self.parser.parse("paid 500 on credit card bill")["type"], "Expense")
+
+    def test_parse_many_keeps_positions(self):
+        results = self.parser.parse_many(["spent 10 on food", "no amount here", "got 300 from mom"])
+        self.assertEqual(len(results), 3)
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2]["category"], "Mom")
+
+if __name__ == "__main__":
+    unittest.main()
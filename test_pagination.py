@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime
+from expense import ExpenseCreate, bulk_insert_expenses
+from testutil import ApiTestCase
+
+class TestPagination(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        # Three days, several expenses on each: pages have to break ties on id
+        items = [
+            ExpenseCreate(amount=i, category=("Food", "Rent")[i % 2], date=datetime(2024, 1, 1 + i % 3), wallet_id=1)
+            for i in range(10)
+        ]
+        with self.Session() as db:
+            self.ids, _ = bulk_insert_expenses(db, 1, items)
+            db.commit()
+        self.dates = {id_: item.date.date().isoformat() for id_, item in zip(self.ids, items)}
+        self.categories = {id_: item.category for id_, item in zip(self.ids, items)}
+
+    def _all_pages(self, limit, **params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            query = {**params, "limit": limit, **({"cursor": cursor} if cursor else {})}
+            res = self.client.get("/expense/", params=query, headers=self.headers)
+            self.assertEqual(res.status_code, 200)
+            ids += [row["id"] for row in res.json()]
+            pages += 1
+            cursor = res.headers.get("X-Next-Cursor")
+            if not cursor:
+                return ids, pages
+
+    def _expected(self, keep=lambda id_: True):
+        # Newest date first, then highest id
+        return sorted(filter(keep, self.ids), key=lambda id_: (self.dates[id_], id_), reverse=True)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        for limit in (1, 3, 4, 10, 50):
+            ids, pages = self._all_pages(limit)
+            self.assertEqual(ids, self._expected(), limit)
+            self.assertEqual(pages, max(1, -(-len(self.ids) // limit)), limit)
+
+    def test_filters_combine_with_paging(self):
+        ids, _ = self._all_pages(2, category="Food", **{"from": "2024-01-02"})
+        self.assertEqual(ids, self._expected(lambda id_: self.categories[id_] == "Food" and self.dates[id_] >= "2024-01-02"))
+        ids, _ = self._all_pages(2, wallet_id=1, to="2024-01-01")
+        self.assertEqual(ids, self._expected(lambda id_: self.dates[id_] <= "2024-01-01"))
+
+    def test_bad_cursor_is_a_400(self):
+        for cursor in ("not-a-cursor", "MjAyNC0wMS0wMQ"):  # garbage, and a date without an id
+            res = self.client.get("/expense/", params={"cursor": cursor}, headers=self.headers)
+            self.assertEqual(res.status_code, 400, cursor)
+
+if __name__ == "__main__":
+    unittest.main()
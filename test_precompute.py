@@ -0,0 +1,126 @@
+import json
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+from models import Forecast, User
+from expense import ExpenseCreate, bulk_insert_expenses
+from precompute import find_outdated, store_forecasts, stored_forecast
+from rollups import FORECAST_HISTORY_DAYS
+from testutil import ApiTestCase, DatabaseTestCase
+from versioning import EXPENSES, FORECASTS, get_version
+
+TODAY = date(2024, 6, 30)
+
+def _payload(today, days, amount=10.0):
+    points = [
+        {"date": (today + timedelta(days=i)).isoformat(), "predicted_amount": amount, "lower": 0, "upper": 2 * amount}
+        for i in range(1, days + 1)
+    ]
+    return {"forecast": points, "by_category": {"Food": points}, "model": "trend"}
+
+def _spend(db, user_id, day, amount=10):
+    bulk_insert_expenses(db, user_id, [ExpenseCreate(amount=amount, category="Food", date=datetime.combine(day, datetime.min.time()))])
+    db.commit()
+
+class TestFindOutdated(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.Session() as db:
+            db.add(User(id=2, name="Quiet", email="quiet@example.com", password_hash="x"))
+            db.add(User(id=3, name="Old", email="old@example.com", password_hash="x"))
+            db.add(User(id=4, name="Gone", email="gone@example.com", password_hash="x", is_active=False))
+            db.commit()
+            _spend(db, 1, TODAY - timedelta(days=3))
+            _spend(db, 3, TODAY - timedelta(days=FORECAST_HISTORY_DAYS + 10))
+            _spend(db, 4, TODAY - timedelta(days=3))
+
+    def _store(self, db, today, user_ids=(1,)):
+        versions = {user_id: get_version(db, user_id, EXPENSES) for user_id in user_ids}
+        store_forecasts(db, versions, {user_id: _payload(today, 5) for user_id in user_ids}, today)
+
+    def test_only_active_users_with_recent_expenses(self):
+        with self.Session() as db:
+            self.assertEqual(find_outdated(db, TODAY, 10), [(1, 1)])
+
+    def test_new_data_or_a_new_day_makes_a_forecast_outdated(self):
+        with self.Session() as db:
+            self._store(db, TODAY)
+            self.assertEqual(find_outdated(db, TODAY, 10), [])
+            # Fitted yesterday
+            self.assertEqual(find_outdated(db, TODAY + timedelta(days=1), 10), [(1, 1)])
+            # Newer expenses than the fit
+            _spend(db, 1, TODAY)
+            self.assertEqual(find_outdated(db, TODAY, 10), [(1, 2)])
+            self._store(db, TODAY)
+            self.assertEqual(find_outdated(db, TODAY, 10), [])
+
+    def test_limit(self):
+        with self.Session() as db:
+            db.add(User(id=5, name="Five", email="five@example.com", password_hash="x"))
+            db.commit()
+            _spend(db, 5, TODAY)
+            self.assertEqual(find_outdated(db, TODAY, 1), [(1, 1)])
+            self.assertEqual(find_outdated(db, TODAY, 10), [(1, 1), (5, 1)])
+
+    def test_store_replaces_the_forecast_and_bumps_its_version(self):
+        with self.Session() as db:
+            self._store(db, TODAY)
+            self._store(db, TODAY)
+            self.assertEqual(get_version(db, 1, FORECASTS), 2)
+            row = db.get(Forecast, 1)
+            self.assertEqual((row.data_version, row.fit_date), (1, TODAY))
+            self.assertEqual(len(json.loads(row.payload)["forecast"]), 5)
+
+class TestStoredForecast(unittest.TestCase):
+    def _row(self, payload, data_version=3):
+        return Forecast(user_id=1, data_version=data_version, fit_date=TODAY, computed_at=datetime(2024, 6, 30, 1), payload=json.dumps(payload))
+
+    def test_slices_to_the_requested_days_from_tomorrow(self):
+        row = self._row(_payload(TODAY, 5))
+        body = stored_forecast(row, 3, TODAY, 3)
+        self.assertEqual([p["date"] for p in body["forecast"]], ["2024-07-01", "2024-07-02", "2024-07-03"])
+        self.assertEqual(body["by_category"]["Food"], body["forecast"])
+        self.assertEqual(body["computed_at"], "2024-06-30T01:00:00Z")
+        # A day later the stored horizon starts one day in
+        body = stored_forecast(row, 3, TODAY + timedelta(days=1), 4)
+        self.assertEqual([p["date"] for p in body["forecast"]], ["2024-07-02", "2024-07-03", "2024-07-04", "2024-07-05"])
+
+    def test_none_when_the_stored_horizon_is_too_short(self):
+        row = self._row(_payload(TODAY, 5))
+        self.assertIsNone(stored_forecast(row, 3, TODAY, 6))
+        self.assertIsNone(stored_forecast(row, 3, TODAY + timedelta(days=1), 5))
+        # Without data there is nothing to run short of
+        empty = self._row({"forecast": [], "by_category": {}, "model": None})
+        self.assertEqual(stored_forecast(empty, 3, TODAY, 60)["forecast"], [])
+
+    def test_stale_when_expenses_moved_on(self):
+        row = self._row(_payload(TODAY, 5))
+        self.assertFalse(stored_forecast(row, 3, TODAY, 3)["stale"])
+        self.assertTrue(stored_forecast(row, 4, TODAY, 3)["stale"])
+
+class TestStoredForecastApi(ApiTestCase):
+    def test_storing_a_forecast_changes_the_report_etag(self):
+        today = date.today()
+        with self.Session() as db:
+            _spend(db, 1, today - timedelta(days=2))
+        with mock.patch("report.PRECOMPUTE_ENABLED", True):
+            res = self.client.get("/report/forecast", params={"days": 3}, headers=self.headers)
+            self.assertFalse(res.json()["stale"])
+            etag = res.headers["ETag"]
+
+            with self.Session() as db:
+                store_forecasts(db, {1: get_version(db, 1, EXPENSES)}, {1: _payload(today, 5, amount=123.0)}, today)
+            res = self.client.get("/report/forecast", params={"days": 3}, headers={**self.headers, "If-None-Match": etag})
+            self.assertEqual(res.status_code, 200)
+            self.assertNotEqual(res.headers["ETag"], etag)
+            self.assertEqual([p["predicted_amount"] for p in res.json()["forecast"]], [123.0] * 3)
+            self.assertFalse(res.json()["stale"])
+
+            with self.Session() as db:
+                _spend(db, 1, today)
+            res = self.client.get("/report/forecast", params={"days": 3}, headers=self.headers)
+            self.assertEqual(res.json()["forecast"][0]["predicted_amount"], 123.0)
+            self.assertTrue(res.json()["stale"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+import report
+from expense import ExpenseCreate, bulk_insert_expenses
+from income import IncomeCreate, bulk_insert_incomes
+from models import User, Wallet
+from testutil import ApiTestCase
+
+class ReportTestCase(ApiTestCase):
+    """User 1 has incomes and expenses around the January/February 2024 boundary; user 2 has one of each."""
+
+    def setUp(self):
+        super().setUp()
+        with self.Session() as db:
+            db.add(User(id=2, name="Other", email="other@example.com", password_hash="x"))
+            db.add(Wallet(id=2, user_id=2, name="Other", balance=0))
+            db.commit()
+            bulk_insert_incomes(db, 1, [
+                IncomeCreate(amount=1000, source="Salary", date=datetime(2024, 1, 31), wallet_id=1),
+                IncomeCreate(amount=50, source="Refund", date=datetime(2024, 2, 11), wallet_id=1),
+            ])
+            bulk_insert_expenses(db, 1, [
+                ExpenseCreate(amount=10, category="Food", date=datetime(2024, 1, 31), wallet_id=1),  # Wednesday
+                ExpenseCreate(amount=20, category="Food", date=datetime(2024, 2, 1), wallet_id=1),  # Thursday
+                ExpenseCreate(amount=300, category="Rent", date=datetime(2024, 2, 5), wallet_id=1),  # Monday
+                ExpenseCreate(amount=5, category="Food", date=datetime(2024, 2, 11), wallet_id=1),  # Sunday
+            ])
+            bulk_insert_incomes(db, 2, [IncomeCreate(amount=7, source="Gift", date=datetime(2024, 2, 1), wallet_id=2)])
+            bulk_insert_expenses(db, 2, [ExpenseCreate(amount=9, category="Fuel", date=datetime(2024, 2, 1), wallet_id=2)])
+            db.commit()
+
+    def _get(self, path, **params):
+        res = self.client.get(path, params=params, headers=self.headers)
+        self.assertEqual(res.status_code, 200, res.text)
+        return res
+
+class TestTrend(ReportTestCase):
+    def _trend(self, **params):
+        return [(row["period"], row["income"], row["expense"]) for row in self._get("/report/trend", **params).json()]
+
+    def test_month_buckets_by_default(self):
+        self.assertEqual(self._trend(), [("2024-01", 1000, 10), ("2024-02", 50, 325)])
+        self.assertNotIn("month", self._get("/report/trend").json()[0])
+
+    def test_week_buckets_are_labelled_by_their_monday(self):
+        self.assertEqual(self._trend(granularity="week"), [("2024-01-29", 1000, 30), ("2024-02-05", 50, 305)])
+
+    def test_day_buckets_and_date_window(self):
+        self.assertEqual(self._trend(granularity="day", **{"from": "2024-02-01", "to": "2024-02-05"}), [
+            ("2024-02-01", 0, 20), ("2024-02-05", 0, 300),
+        ])
+
+    def test_unknown_granularity(self):
+        self.assertEqual(self.client.get("/report/trend", params={"granularity": "year"}, headers=self.headers).status_code, 422)
+
+class TestExport(ReportTestCase):
+    ROWS = [
+        ("2024-02-11", "Income", "Refund", 50.0), ("2024-02-11", "Expense", "Food", 5.0),
+        ("2024-02-05", "Expense", "Rent", 300.0), ("2024-02-01", "Expense", "Food", 20.0),
+        ("2024-01-31", "Income", "Salary", 1000.0), ("2024-01-31", "Expense", "Food", 10.0),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        # The export streams from its own session rather than the request's
+        patcher = mock.patch.object(report, "SessionLocal", self.Session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertNewestFirst(self, rows):
+        dates = [row[0] for row in rows]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        # Only user 1's rows; order within a day is not specified
+        self.assertEqual(sorted(rows), sorted(self.ROWS))
+
+    def test_csv(self):
+        res = self._get("/report/export")
+        self.assertTrue(res.headers["content-type"].startswith("text/csv"))
+        self.assertIn("attachment", res.headers["content-disposition"])
+        header, *rows = csv.reader(io.StringIO(res.text))
+        self.assertEqual(header, ["date", "type", "category", "amount"])
+        self.assertNewestFirst([(d, type_, category, float(amount)) for d, type_, category, amount in rows])
+
+    def test_ndjson(self):
+        res = self._get("/report/export", format="ndjson")
+        self.assertTrue(res.headers["content-type"].startswith("application/x-ndjson"))
+        records = [json.loads(line) for line in res.text.splitlines()]
+        self.assertEqual(set(records[0]), {"date", "type", "category", "amount"})
+        self.assertNewestFirst([(r["date"], r["type"], r["category"], r["amount"]) for r in records])
+
+    def test_rows_span_fetch_chunks(self):
+        with mock.patch.object(report, "EXPORT_CHUNK_ROWS", 4):
+            _, *rows = csv.reader(io.StringIO(self._get("/report/export").text))
+        self.assertEqual(len(rows), len(self.ROWS))
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get("/report/export", params={"format": "xml"}, headers=self.headers).status_code, 422)
+
+class TestDashboard(ReportTestCase):
+    def test_all_sections_by_default(self):
+        body = self._get("/report/dashboard").json()
+        self.assertEqual(set(body), {"summary", "categories", "trend", "wallets"})
+        self.assertEqual(body["summary"], self._get("/report/summary").json())
+        self.assertEqual(body["categories"], body["summary"]["expense_by_category"])
+        self.assertEqual(body["trend"], self._get("/report/trend").json())
+        self.assertEqual([w["id"] for w in body["wallets"]], [1])
+
+    def test_include_selects_sections(self):
+        body = self._get("/report/dashboard", include="trend, wallets", granularity="week").json()
+        self.assertEqual(set(body), {"trend", "wallets"})
+        self.assertEqual(body["trend"], self._get("/report/trend", granularity="week").json())
+        categories = self._get("/report/dashboard", include="categories", **{"from": "2024-02-01"}).json()["categories"]
+        self.assertEqual(sorted((c["category"], c["amount"]) for c in categories), [("Food", 25), ("Rent", 300)])
+
+    def test_trend_window_defaults_to_the_summary_window(self):
+        window = {"from": "2024-02-01", "to": "2024-02-05"}
+        body = self._get("/report/dashboard", include="trend", granularity="day", **window).json()
+        self.assertEqual(body["trend"], self._get("/report/trend", granularity="day", **window).json())
+        # trend_from overrides only the start; the end still follows "to"
+        body = self._get("/report/dashboard", include="trend", granularity="day", trend_from="2024-01-01", **window).json()
+        self.assertEqual([row["period"] for row in body["trend"]], ["2024-01-31", "2024-02-01", "2024-02-05"])
+
+    def test_unknown_section(self):
+        res = self.client.get("/report/dashboard", params={"include": "summary,budgets"}, headers=self.headers)
+        self.assertEqual(res.status_code, 422)
+        self.assertIn("budgets", res.json()["detail"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from report import report_cache
+from testutil import ApiTestCase
+
+class TestReportCache(ApiTestCase):
+    def _summary(self, etag=None):
+        headers = {**self.headers, **({"If-None-Match": etag} if etag else {})}
+        return self.client.get("/report/summary", headers=headers)
+
+    def test_etag_round_trip(self):
+        first = self._summary()
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+
+        not_modified = self._summary(etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.headers["ETag"], etag)
+        self.assertEqual(not_modified.content, b"")
+
+        # Weak comparison: the bare tag matches too, in any position of the list
+        self.assertEqual(self._summary('"other", ' + etag.replace("W/", "")).status_code, 304)
+
+        hits = report_cache.hits
+        again = self._summary('W/"other", "other2"')  # no match: a full response, from the cache
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(report_cache.hits, hits + 1)
+
+    def test_writes_change_the_etag_and_bust_the_cache(self):
+        writes = (
+            ("/income/", {"amount": 100, "source": "Salary", "date": "2024-01-01", "wallet_id": 1}, "total_income", 100),
+            ("/expense/", {"amount": 40, "category": "Food", "date": "2024-01-02", "wallet_id": 1}, "total_expense", 40),
+            ("/wallet/", {"name": "Savings", "balance": 500}, "total_wallet_balance", 560),
+        )
+        etag = self._summary().headers["ETag"]
+        for path, payload, field, expected in writes:
+            self.assertEqual(self.client.post(path, json=payload, headers=self.headers).status_code, 200, path)
+            misses = report_cache.misses
+            res = self._summary(etag)
+            self.assertEqual(res.status_code, 200, path)
+            self.assertNotEqual(res.headers["ETag"], etag, path)
+            self.assertEqual(report_cache.misses, misses + 1, path)
+            self.assertEqual(res.json()[field], expected, path)
+            etag = res.headers["ETag"]
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from testutil import DatabaseTestCase
+from models import Expense, DailyRollup
+from income import IncomeCreate, bulk_insert_incomes
+from expense import ExpenseCreate, bulk_insert_expenses
+from rollups import EXPENSE, INCOME, add_to_rollups, check, rebuild
+
+class TestRollups(DatabaseTestCase):
+    def _load(self, db):
+        start = datetime(2024, 1, 1, 9, 30)
+        expenses = [
+            ExpenseCreate(amount=10 + i, category=("Food", "Rent")[i % 2], date=start + timedelta(days=i % 5), wallet_id=1)
+            for i in range(40)
+        ]
+        incomes = [IncomeCreate(amount=1000, source="Salary", date=start + timedelta(days=i * 15)) for i in range(3)]
+        bulk_insert_expenses(db, 1, expenses[:20])
+        bulk_insert_expenses(db, 1, expenses[20:])  # same days again: upserts accumulate
+        bulk_insert_incomes(db, 1, incomes)
+        db.commit()
+
+    def test_writes_keep_rollups_in_sync(self):
+        with self.Session() as db:
+            self._load(db)
+            self.assertEqual(check(db), [])
+            rollup_total, rollup_count = db.execute(
+                select(func.sum(DailyRollup.total), func.sum(DailyRollup.count)).where(DailyRollup.kind == EXPENSE)
+            ).one()
+            self.assertAlmostEqual(rollup_total, db.scalar(select(func.sum(Expense.amount))))
+            self.assertEqual(rollup_count, 40)
+            # One row per (day, category) actually used, not per transaction
+            self.assertEqual(db.scalar(select(func.count()).select_from(DailyRollup).where(DailyRollup.kind == EXPENSE)), 10)
+            self.assertEqual(db.scalar(select(func.count()).select_from(DailyRollup).where(DailyRollup.kind == INCOME)), 3)
+
+    def test_check_reports_drift_and_rebuild_repairs_it(self):
+        with self.Session() as db:
+            self._load(db)
+            db.execute(update(DailyRollup).where(DailyRollup.kind == INCOME).values(total=DailyRollup.total + 1))
+            add_to_rollups(db, 1, EXPENSE, [(datetime(2030, 1, 1), "Ghost", 5.0)])
+            db.commit()
+            self.assertEqual(len(check(db)), 4)
+            rebuild(db, [1])
+            db.commit()
+            self.assertEqual(check(db), [])
+
+if __name__ == "__main__":
+    unittest.main()
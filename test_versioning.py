@@ -0,0 +1,24 @@
+import unittest
+from unittest import mock
+from testutil import DatabaseTestCase
+from versioning import EXPENSES, WALLETS, bump_version, get_version, get_versions
+
+class TestVersioning(DatabaseTestCase):
+    def _bump_twice(self):
+        with self.Session() as db:
+            self.assertEqual(get_version(db, 1, EXPENSES), 0)
+            bump_version(db, 1, EXPENSES)
+            bump_version(db, 1, EXPENSES)
+            bump_version(db, 1, WALLETS)
+            db.commit()
+            self.assertEqual(get_versions(db, 1), {EXPENSES: 2, WALLETS: 1})
+
+    def test_upsert(self):
+        self._bump_twice()
+
+    def test_portable_fallback(self):
+        with mock.patch("versioning.upsert_insert", return_value=None):
+            self._bump_twice()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+
+import threading
+import unittest
+from testutil import DatabaseTestCase
+from models import Wallet
+from wallet import apply_wallet_delta
+
+THREADS = 8
+WRITES_PER_THREAD = 50
+
+class TestWalletConcurrency(DatabaseTestCase):
+    def test_atomic_update_loses_nothing(self):
+        def worker():
+            for _ in range(WRITES_PER_THREAD):
+                with self.Session() as db:
+                    apply_wallet_delta(db, 1, 1, 1)
+                    db.commit()
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        with self.Session() as db:
+            self.assertEqual(db.get(Wallet, 1).balance, THREADS * WRITES_PER_THREAD)
+
+    def test_other_users_wallet_is_rejected(self):
+        from fastapi import HTTPException
+        with self.Session() as db:
+            with self.assertRaises(HTTPException):
+                apply_wallet_delta(db, 2, 1, 100)
+            db.rollback()
+            self.assertEqual(db.get(Wallet, 1).balance, 0)
+
+if __name__ == "__main__":
+    unittest.main()
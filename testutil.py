@@ -0,0 +1,67 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from database import Base, make_engine, to_async_url
+from models import User, Wallet
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Fresh SQLite file per test with the full schema; user 1 owns wallet 1.
+    Session and AsyncSession are bound to it.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_url = f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}"
+        self.engine = make_engine(self.db_url)
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine, autoflush=False)
+        with self.Session() as db:
+            db.add(User(id=1, name="Test", email="test@example.com", password_hash="x"))
+            db.add(Wallet(id=1, user_id=1, name="Main", balance=0))
+            db.commit()
+        # NullPool: each test's event loops open their own connections
+        self.async_engine = create_async_engine(to_async_url(self.db_url), poolclass=NullPool)
+        self.AsyncSession = async_sessionmaker(bind=self.async_engine, autoflush=False, expire_on_commit=False)
+
+    def tearDown(self):
+        asyncio.run(self.async_engine.dispose())
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+class ApiTestCase(DatabaseTestCase):
+    """
+    DatabaseTestCase plus a TestClient on the app, with its sync and async
+    sessions pointed at the test database and headers for user 1. The lifespan
+    doesn't run, and the in-process caches start empty.
+    """
+
+    def setUp(self):
+        super().setUp()
+        from fastapi.testclient import TestClient
+        from auth import create_access_token, get_async_db, get_db
+        from cache import registry
+        from main import app
+
+        def test_db():
+            with self.Session() as db:
+                yield db
+
+        async def test_async_db():
+            async with self.AsyncSession() as db:
+                yield db
+
+        self.app = app
+        app.dependency_overrides.update({get_db: test_db, get_async_db: test_async_db})
+        for cache in registry.values():
+            cache.clear()
+        self.client = TestClient(app)
+        self.headers = {"Authorization": f"Bearer {create_access_token({'sub': 'test@example.com'})}"}
+
+    def tearDown(self):
+        self.app.dependency_overrides.clear()
+        super().tearDown()
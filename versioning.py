@@ -0,0 +1,41 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from database import upsert_insert
+from models import DataVersion
+
+# Version scopes
+INCOMES = "income"
+EXPENSES = "expense"
+WALLETS = "wallet"
+FORECASTS = "forecast"  # bumped when a precomputed forecast is stored
+
+def bump_version(db: Session, user_id: int, scope: str):
+    # Runs inside the caller's transaction so the bump commits with the write.
+    # One upsert, so two first bumps for a user can't both try to insert the row.
+    dialect_insert = upsert_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(DataVersion).values(user_id=user_id, scope=scope, version=1)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[DataVersion.user_id, DataVersion.scope],
+            set_={"version": DataVersion.version + 1},
+        ))
+        return
+    # Portable fallback
+    result = db.execute(
+        update(DataVersion)
+        .where(DataVersion.user_id == user_id, DataVersion.scope == scope)
+        .values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.execute(insert(DataVersion).values(user_id=user_id, scope=scope, version=1))
+
+def get_version(db: Session, user_id: int, scope: str) -> int:
+    version = db.scalar(
+        select(DataVersion.version).where(DataVersion.user_id == user_id, DataVersion.scope == scope)
+    )
+    return version or 0
+
+def get_versions(db: Session, user_id: int) -> dict:
+    # Every scope for the user in one query; missing scopes read as 0
+    rows = db.execute(select(DataVersion.scope, DataVersion.version).where(DataVersion.user_id == user_id))
+    return dict(rows.all())
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
 from typing import List
 from database import SessionLocal
 from models import Wallet, User
-from auth import get_db, SECRET_KEY, ALGORITHM
+from auth import get_async_db, SECRET_KEY, ALGORITHM
 from jose import jwt, JWTError
 from pydantic import BaseModel
+from versioning import bump_version, WALLETS
 from fastapi.security import OAuth2PasswordBearer
 
 # Pydantic schema
@@ -28,19 +31,42 @@ from auth import get_current_user
 
 # Create wallet
 @router.post("/", response_model=WalletResponse)
-def create_wallet(wallet: WalletCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_wallet(wallet: WalletCreate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     new_wallet = Wallet(
         name=wallet.name,
         balance=wallet.balance,
         user_id=current_user.id
     )
     db.add(new_wallet)
-    db.commit()
-    db.refresh(new_wallet)
+    await db.run_sync(bump_version, current_user.id, WALLETS)
+    await db.commit()
     return new_wallet
 
 # Get all wallets for current user
 @router.get("/", response_model=List[WalletResponse])
-def get_wallets(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    wallets = db.query(Wallet).filter(Wallet.user_id == current_user.id).all()
-    return wallets
+async def get_wallets(db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    wallets = await db.scalars(select(Wallet).where(Wallet.user_id == current_user.id))
+    return wallets.all()
+
+def apply_wallet_delta(db: Session, user_id: int, wallet_id: int, delta: float):
+    """
+    Atomically adds delta to a wallet's balance in one UPDATE, with the ownership
+    check folded into the WHERE clause. No read-modify-write, so concurrent writes
+    cannot lose updates. Raises 404 if the wallet is missing or not the user's.
+    """
+    result = db.execute(
+        update(Wallet)
+        .where(Wallet.id == wallet_id, Wallet.user_id == user_id)
+        .values(balance=Wallet.balance + delta)
+    )
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+
+def apply_wallet_deltas(db: Session, user_id: int, deltas: dict):
+    """
+    Applies one net balance change per wallet for a batch of transactions.
+    Raises 404 if any wallet is missing or belongs to another user. Caller commits.
+    """
+    for wallet_id, delta in deltas.items():
+        if wallet_id:
+            apply_wallet_delta(db, user_id, wallet_id, delta)